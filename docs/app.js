@@ -4,6 +4,7 @@ const POLYMARKET_REF = '?via=ferdous-bhai';
 let allMarkets = [];
 let selectedCategories = new Set();
 let currentLastUpdated = null;
+let currentVersion = null;
 
 function getAllCategoriesFromData() {
     return [...new Set(allMarkets.map(m => m.category || 'Uncategorized'))];
@@ -127,6 +128,34 @@ async function fetchMarketsData() {
     return response.json();
 }
 
+// Small sidecar refreshed every run; markets.json itself is only rewritten when its version changes
+async function fetchMarketsMeta() {
+    const response = await fetch(`markets.meta.json?t=${Date.now()}`);
+    if (!response.ok) {
+        throw new Error(`Failed to load metadata: ${response.status}`);
+    }
+    return response.json();
+}
+
+// Patch allMarkets from markets.delta.json; returns false when the full file must be reloaded
+async function applyDelta(meta) {
+    const response = await fetch(`${meta.delta.key}?v=${meta.version}`);
+    if (!response.ok) return false;
+    const delta = await response.json();
+    if (delta.version !== meta.version || delta.baseVersion !== currentVersion) return false;
+
+    const byId = new Map(allMarkets.map(m => [m.id, m]));
+    for (const market of delta.changed) byId.set(market.id, market);
+    const markets = delta.order.map(id => byId.get(id));
+    if (markets.some(m => !m)) return false;
+
+    allMarkets = markets;
+    currentVersion = delta.version;
+    renderCategoryFilters();
+    renderMarkets();
+    return true;
+}
+
 function createMarketItem(market) {
     const days = getDaysRemaining(market.endDateIso);
     const title = market.statement || market.question;
@@ -166,11 +195,13 @@ async function loadMarkets() {
 
     try {
         const data = await fetchMarketsData();
+        const meta = await fetchMarketsMeta().catch(() => data);
 
-        currentLastUpdated = data.lastUpdated;
+        currentVersion = data.version;
+        currentLastUpdated = meta.version === data.version ? meta.lastUpdated : data.lastUpdated;
 
-        if (data.lastUpdated) {
-            lastUpdatedEl.textContent = formatLastUpdated(data.lastUpdated);
+        if (currentLastUpdated) {
+            lastUpdatedEl.textContent = formatLastUpdated(currentLastUpdated);
         }
 
         if (!data.markets || data.markets.length === 0) {
@@ -205,7 +236,13 @@ setInterval(() => {
 // Check for new data every 60 seconds
 setInterval(async () => {
     try {
-        const data = await fetchMarketsData();
-        if (data.lastUpdated !== currentLastUpdated) loadMarkets();
+        const meta = await fetchMarketsMeta();
+        if (meta.version === currentVersion) {
+            currentLastUpdated = meta.lastUpdated;
+        } else if (currentVersion && meta.delta?.baseVersion === currentVersion && await applyDelta(meta)) {
+            currentLastUpdated = meta.lastUpdated;
+        } else {
+            loadMarkets();
+        }
     } catch {}
 }, 60000);
@@ -0,0 +1,121 @@
+"""Micro-benchmark: per-record PolymarketMarket(**d).model_dump() vs the bulk page validators.
+
+Records are split into 100-record pages like the Gamma API returns them.
+
+    uv run python scripts/bench_validation.py --records 20000
+"""
+import argparse
+import json
+import time
+from typing import Any, Callable
+
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+
+from fetch_markets import PAGE_LIMIT, parse_json_strings, validate_page, validate_records, validate_volume
+
+class PolymarketMarket(BaseModel):
+    """The model the original fetch_page loop validated each record with, kept as the baseline."""
+
+    model_config = ConfigDict(extra="allow")
+
+    id: str
+    question: str
+    endDateIso: str
+    active: bool
+    closed: bool
+    archived: bool | None = None
+    volume: str | float
+    liquidity: str | float | None = None
+    outcomePrices: list[str] | str
+    outcomes: list[str] | str
+    negRiskMarketID: str | None = None
+    events: list[dict[str, Any]] | None = None
+    slug: str | None = None
+    description: str | None = None
+
+    @field_validator('outcomePrices', 'outcomes', mode='before')
+    @classmethod
+    def parse_json_strings(cls, v: Any) -> list[str]:
+        return parse_json_strings(v)
+
+    @field_validator('volume', mode='before')
+    @classmethod
+    def validate_volume(cls, v: Any) -> str | float:
+        return validate_volume(v)
+
+def synthetic_record(i: int) -> dict[str, Any]:
+    """A Gamma-API-shaped market with the long tail of extra fields the API returns."""
+    record: dict[str, Any] = {
+        'id': str(i),
+        'question': f'Will thing {i} happen by December 31?',
+        'endDateIso': '2026-12-31',
+        'active': True,
+        'closed': False,
+        'archived': False,
+        'volume': f'{i * 37.5:.2f}',
+        'liquidity': f'{i * 3.1:.2f}',
+        'outcomePrices': json.dumps([f'{0.5 + (i % 50) / 100:.3f}', f'{0.5 - (i % 50) / 100:.3f}']),
+        'outcomes': '["Yes", "No"]',
+        'negRiskMarketID': None,
+        'slug': f'thing-{i}',
+        'description': 'Resolution criteria. ' * 40,
+        'events': [{'id': str(i), 'title': f'Event {i}', 'slug': f'event-{i}', 'volume': i * 12.5}],
+    }
+    record.update({f'field{k}': k for k in range(40)})
+    if i % 500 == 0:
+        record['outcomePrices'] = 'not json'  # Invalid records are skipped individually
+    return record
+
+Validator = Callable[[list[bytes]], list[dict[str, Any]]]
+
+def per_record(pages: list[bytes]) -> list[dict[str, Any]]:
+    """The original fetch_page loop."""
+    validated = []
+    for body in pages:
+        for market_data in json.loads(body):
+            try:
+                validated.append(PolymarketMarket(**market_data).model_dump())
+            except ValidationError:
+                continue
+    return validated
+
+def bulk_bytes(pages: list[bytes]) -> list[dict[str, Any]]:
+    """Cold-cache path: validate each body directly, decoding only pages that hold invalid records."""
+    validated = []
+    for body in pages:
+        page = validate_page(body)
+        validated.extend(page if page is not None else (m for _, m in validate_records(json.loads(body))))
+    return validated
+
+def bulk_decoded(pages: list[bytes]) -> list[dict[str, Any]]:
+    """Warm-cache path: records are decoded for fingerprinting, then validated a page at a time."""
+    return [m for body in pages for _, m in validate_records(json.loads(body))]
+
+def measure(name: str, fn: Validator, pages: list[bytes], records: int, repeat: int) -> float:
+    best = min(_timed(fn, pages) for _ in range(repeat))
+    print(f"{name:<14} {records / best:>12,.0f} records/s  ({best * 1000:.1f} ms)")
+    return best
+
+def _timed(fn: Validator, pages: list[bytes]) -> float:
+    started = time.perf_counter()
+    fn(pages)
+    return time.perf_counter() - started
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    records = [synthetic_record(i) for i in range(args.records)]
+    pages = [json.dumps(records[i:i + PAGE_LIMIT]).encode() for i in range(0, len(records), PAGE_LIMIT)]
+    expected = len(per_record(pages))
+    assert len(bulk_bytes(pages)) == len(bulk_decoded(pages)) == expected, "validators disagree on valid records"
+
+    baseline = measure('per-record', per_record, pages, args.records, args.repeat)
+    for name, fn in (('bulk (bytes)', bulk_bytes), ('bulk (decoded)', bulk_decoded)):
+        best = measure(name, fn, pages, args.records, args.repeat)
+        print(f"{'':<14} {baseline / best:>12.2f}x vs per-record")
+
+if __name__ == '__main__':
+    main()
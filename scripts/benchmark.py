@@ -0,0 +1,291 @@
+"""Offline pipeline benchmark: time and peak memory per stage against a stubbed Gamma API, LLM and R2.
+
+Synthetic (or recorded) pages are served from a local HTTP stub, LLM calls are answered by a
+deterministic fake genai client and uploads land in an in-memory S3. Each size runs in a fresh
+temporary directory; the first run is cold, later runs re-fetch with some prices moved.
+
+    uv run python scripts/benchmark.py --markets 600 10000 100000 --runs 2
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import UTC, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Callable
+from urllib.parse import parse_qs, urlparse
+
+import fetch_markets as fm
+
+# (stage, module functions attributed to it); time and memory are exclusive of nested stages
+STAGES = [
+    ('fetch', ['fetch_markets']),
+    ('validate', ['validate_page', 'validate_records']),
+    ('filter', ['MarketStream.add']),
+    ('snapshot write*', ['write_snapshot_rows', 'cleanup_old_snapshots']),
+    ('stage graph', ['StageGraph.run']),
+    ('history load*', ['load_historical_prices']),
+    ('dedup*', ['deduplicate_related_markets', 'load_redundancy_cache', 'RedundancyPlan.__init__', 'RedundancyPlan.resolve']),
+    ('statements*', ['load_cached_statements', 'generate_statements', 'save_cached_statements']),
+    ('publish', ['save_markets']),
+    ('other', ['run_pipeline']),
+]
+SUBJECTS = ['Bitcoin', 'Ethereum', 'Gold', 'Tesla', 'Nvidia', 'Oil', 'The Fed', 'Lakers', 'Arsenal', 'Trump']
+CATEGORIES = ['Crypto', 'Markets', 'Economy', 'Sports', 'Politics']
+CHECKED_ID = re.compile(r'^- \[([^\]]+)\]', re.MULTILINE)
+
+def synthetic_market(i: int, now: datetime, run: int) -> dict[str, Any]:
+    """A Gamma-API-shaped market. Every 20th market moves its price on each later run."""
+    rng = random.Random(i)
+    subject = SUBJECTS[i % len(SUBJECTS)]
+    group = i // 4
+    yes = rng.uniform(0.3, 0.99)
+    if run and i % 20 == 0:
+        yes = min(0.99, max(0.01, yes + random.Random(i * 1000 + run).uniform(-0.05, 0.05)))
+    end = now + timedelta(days=rng.randint(-5, 120))
+    if i % 3 == 0:
+        question = f"Will {subject} be above ${(i % 7 + 1) * 1000:,} on {end:%B %-d}?"
+    else:
+        question = f"Will {subject} {rng.choice(['win', 'announce', 'reach', 'launch'])} thing {i} by {end:%B %-d}?"
+    return {
+        'id': str(i),
+        'question': question,
+        'endDateIso': end.strftime('%Y-%m-%d'),
+        'active': i % 50 != 0,
+        'closed': False,
+        'archived': False,
+        'volume': f'{rng.uniform(100, 5_000_000):.2f}',
+        'liquidity': f'{rng.uniform(10, 100_000):.2f}',
+        'outcomePrices': json.dumps([f'{yes:.3f}', f'{1 - yes:.3f}']),
+        'outcomes': '["Yes", "No"]',
+        'negRiskMarketID': f'0xneg{group}' if i % 8 < 4 else None,
+        'slug': f'market-{i}',
+        'description': 'Resolution criteria. ' * 20,
+        'events': [{'id': str(group), 'title': f'{subject} event {group}', 'slug': f'event-{group}'}],
+    }
+
+def load_recorded(path: str, count: int) -> list[dict[str, Any]]:
+    """Recorded API markets tiled up to `count`, with ids suffixed so copies stay distinct."""
+    with open(path) as f:
+        recorded = json.load(f)
+    return [
+        {**recorded[i % len(recorded)], 'id': f"{recorded[i % len(recorded)]['id']}-{i // len(recorded)}"}
+        for i in range(count)
+    ]
+
+class GammaStub(ThreadingHTTPServer):
+    """Serves pre-encoded pages at /markets?offset=&limit= like the Gamma API."""
+
+    def __init__(self) -> None:
+        super().__init__(('127.0.0.1', 0), GammaHandler)
+        self.pages: dict[tuple[int, int], bytes] = {}
+
+    def load(self, markets: list[dict[str, Any]]) -> None:
+        # Encoded up front so serving a page costs the pipeline as little CPU as a remote API would
+        self.markets = markets
+        self.pages = {
+            (offset, fm.PAGE_LIMIT): json.dumps(markets[offset:offset + fm.PAGE_LIMIT]).encode()
+            for offset in range(0, len(markets) + 1, fm.PAGE_LIMIT)
+        }
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/markets'
+
+class GammaHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        query = parse_qs(urlparse(self.path).query)
+        offset, limit = int(query['offset'][0]), int(query['limit'][0])
+        body = self.server.pages.get((offset, limit)) or json.dumps(self.server.markets[offset:offset + limit]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+class FakeModels:
+    """Deterministic stand-in for `client.aio.models`, answering the statement and redundancy prompts."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.calls = 0
+
+    async def generate_content(self, model: str, contents: str, config: dict[str, Any]) -> SimpleNamespace:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if config['response_schema'] is fm.RedundancyResult:
+            # Every 7th checked market is reported redundant to the first one in the prompt
+            ids = CHECKED_ID.findall(contents)
+            redundant = [mid for mid in ids[1:] if int(re.sub(r'\D', '', mid) or 0) % 7 == 0]
+            return SimpleNamespace(parsed=fm.RedundancyResult(
+                redundant_market_ids=redundant, reasoning=['implied'] * len(redundant), implied_by=[ids[0]] * len(redundant),
+            ))
+        return SimpleNamespace(parsed=[
+            fm.IndexedStatement(index=int(index), statement=question.rstrip('?') + '.', category=CATEGORIES[int(index) % len(CATEGORIES)])
+            for index, question in fm.STATEMENT_ITEM.findall(contents)
+        ])
+
+class MemoryS3:
+    def __init__(self) -> None:
+        self.objects: dict[str, bytes] = {}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs: Any) -> None:
+        self.objects[Key] = Body
+
+class StageRecorder:
+    """Wraps stage functions: wall time goes to the innermost open stage of its thread, tracemalloc peaks to
+    every open stage on any thread.
+
+    Each thread keeps its own stack of open stages. tracemalloc counts the whole process, so a stage on a
+    background thread (the snapshot writer, the StageGraph stages) is also charged for what overlapped it.
+    """
+
+    def __init__(self, trace_memory: bool) -> None:
+        self.trace_memory = trace_memory
+        self.seconds: dict[str, float] = {}
+        self.peak: dict[str, int] = {}
+        self.stacks: dict[int, list[tuple[str, float, int]]] = {}
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.seconds = {stage: 0.0 for stage, _ in STAGES}
+        self.peak = {stage: 0 for stage, _ in STAGES}
+
+    def _mark_peak(self) -> None:
+        if not self.trace_memory:
+            return
+        _, peak = tracemalloc.get_traced_memory()
+        for stack in self.stacks.values():
+            for stage, _, baseline in stack:
+                self.peak[stage] = max(self.peak[stage], peak - baseline)
+        tracemalloc.reset_peak()
+
+    def wrap(self, stage: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            with self.lock:
+                stack = self.stacks.setdefault(threading.get_ident(), [])
+                self._mark_peak()
+                baseline = tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+                if stack:
+                    outer, outer_start, _ = stack[-1]
+                    self.seconds[outer] += time.perf_counter() - outer_start
+                stack.append((stage, time.perf_counter(), baseline))
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self._mark_peak()
+                    _, started, _ = stack.pop()
+                    self.seconds[stage] += time.perf_counter() - started
+                    if stack:
+                        outer, _, outer_baseline = stack[-1]
+                        stack[-1] = (outer, time.perf_counter(), outer_baseline)
+        return timed
+
+    def install(self) -> None:
+        for stage, names in STAGES:
+            for name in names:
+                owner, _, attr = name.rpartition('.')
+                target = getattr(fm, owner) if owner else fm
+                setattr(target, attr, self.wrap(stage, getattr(target, attr)))
+
+def seed_history(markets: list[dict[str, Any]], now: datetime) -> None:
+    """Older snapshots so every price-change horizon and the sparkline have something to find."""
+    conn = fm.get_db()
+    ages = (timedelta(days=31), timedelta(days=8), timedelta(days=4), timedelta(hours=25), timedelta(hours=7), timedelta(hours=2), timedelta(minutes=20))
+    for age in ages:
+        fm.write_snapshot(conn, fm.markets_from_records(markets), (now - age).strftime(fm.SNAPSHOT_TS_FORMAT))
+    conn.commit()
+    fm._snapshot_state = None
+
+def run_size(count: int, args: argparse.Namespace, stub: GammaStub, recorder: StageRecorder, models: FakeModels) -> None:
+    now = datetime.now(UTC)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.makedirs('docs')
+        # Warm runs stand in for daemon cycles, which keep the record cache, unless --one-shot
+        fm._record_cache = fm.MarketRecordCache(enabled=not args.one_shot)
+        fm._s3_client = MemoryS3()
+        fm.init_database()
+
+        for run in range(args.runs):
+            # Each later run delists the oldest --churn share of synthetic markets and lists as many new ones
+            shift = run * int(count * args.churn)
+            markets = (load_recorded(args.recorded, count) if args.recorded
+                       else [synthetic_market(i, now, run) for i in range(shift, count + shift)])
+            stub.load(markets)
+            if run == 0:
+                seed_history(markets, now)
+            del markets
+            recorder.reset()
+            models.calls = 0
+            started = time.perf_counter()
+
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+                fm.run_pipeline()
+
+            total = time.perf_counter() - started
+            published = sum(len(body) for body in fm._s3_client.objects.values())
+            print(f"\n{count:,} markets, run {run + 1} ({'cold' if run == 0 else 'warm'}): {total:.2f}s total, "
+                  f"{fm._metrics.markets_published:,} published, {models.calls} LLM calls, {published / 1024:,.0f} KiB in R2")
+            print(f"  {'stage':<16} {'ms':>10} {'peak MiB':>10}")
+            for stage, _ in STAGES:
+                peak = f"{recorder.peak[stage] / 2**20:>10.1f}" if args.memory else f"{'-':>10}"
+                print(f"  {stage:<16} {recorder.seconds[stage] * 1000:>10.1f} {peak}")
+            print("  * on background threads, overlapping the other stages; peaks include what ran alongside")
+        fm.close_db()
+        os.chdir(args.cwd)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--markets', type=int, nargs='+', default=[600, 10000], help="market counts to benchmark")
+    parser.add_argument('--runs', type=int, default=2, help="runs per size; the first is cold")
+    parser.add_argument('--recorded', help="JSON list of recorded Gamma API markets to replay instead of synthetic ones")
+    parser.add_argument('--llm-latency', type=float, default=0.0, help="seconds the fake LLM waits per call")
+    parser.add_argument('--churn', type=float, default=0.0, help="share of synthetic markets replaced by new ones each later run")
+    parser.add_argument('--one-shot', action='store_true', help="no record cache between runs, like separate processes")
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="skip tracemalloc (faster, no peaks)")
+    parser.add_argument('--verbose', action='store_true', help="show the pipeline's own output")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    args.cwd = os.getcwd()
+    if args.recorded:
+        args.recorded = os.path.abspath(args.recorded)
+
+    stub = GammaStub()
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    fm.API_URL = stub.url
+    models = FakeModels(args.llm_latency)
+    fake_client = SimpleNamespace(aio=SimpleNamespace(models=models))
+    fm.get_genai_client = lambda api_key: fake_client
+    os.environ.update(GOOGLE_API_KEY='benchmark', CLOUDFLARE_ACCOUNT_ID='benchmark',
+                      R2_ACCESS_KEY_ID='benchmark', R2_SECRET_ACCESS_KEY='benchmark')
+
+    recorder = StageRecorder(args.memory)
+    recorder.install()
+    if args.memory:
+        tracemalloc.start()
+    try:
+        for count in args.markets:
+            run_size(count, args, stub, recorder, models)
+    finally:
+        stub.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,35 @@
 import json
+import argparse
 import httpx
 import asyncio
+import random
 import sqlite3
 import logging
+import hashlib
+import gzip
+import functools
+import heapq
+import signal
+import threading
+import queue
+import time
+import sys
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import aclosing, contextmanager
+import re
 from datetime import datetime, timedelta, UTC
-from typing import Any
+from typing import Annotated, Any, AsyncIterator, Callable, Iterable, Iterator, NamedTuple
 import os
 import boto3
+import brotli
 from botocore.config import Config
 from google import genai
-from pydantic import BaseModel, Field, field_validator, ValidationError, ConfigDict
+import numpy as np
+from pydantic import BaseModel, BeforeValidator, computed_field, ValidationError, TypeAdapter
+from typing_extensions import NotRequired, TypedDict
 from decimal import Decimal
+from email.utils import parsedate_to_datetime
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 log = logging.getLogger(__name__)
@@ -21,175 +40,950 @@ try:
 except ImportError:
     pass
 
+try:
+    import resource
+except ImportError:
+    resource = None
+
 API_URL = "https://gamma-api.polymarket.com/markets"
 OUTPUT_FILE = "docs/markets.json"
+MARKETS_KEY, SIDECAR_KEY, DELTA_KEY = 'markets.json', 'markets.meta.json', 'markets.delta.json'
+CATEGORY_PREFIX = 'categories/'
+# Published record schema. 1 republished the whole API record; 2 publishes `Market.published()`, which keeps
+# the version 1 names and types of the fields it carries over. Bump on any incompatible record change.
+PUBLISHED_SCHEMA_VERSION = 2
 DB_FILE = "markets.db"
+DB_BUSY_TIMEOUT = 30
+METRICS_FILE = "metrics.jsonl"
+METRICS_TEXTFILE = "metrics.prom"
+SNAPSHOT_TS_FORMAT = '%Y-%m-%d_%H-%M'
 MODEL = "gemini-2.5-flash-lite"
 
-class PolymarketMarket(BaseModel):
-    model_config = ConfigDict(extra="allow")
+PAGE_LIMIT = 100
+INITIAL_CONCURRENCY, MAX_CONCURRENCY = 4, 16
+HTTP_TIMEOUT = 30
+MAX_RETRIES = 4
+BACKOFF_BASE, BACKOFF_MAX, RETRY_AFTER_MAX = 0.5, 20.0, 60.0
+
+# Feature half-lives in hours
+MOMENTUM_HALF_LIVES = {'1h': 1.0, '6h': 6.0, '24h': 24.0}
+VOLATILITY_HALF_LIFE = 24.0
+VOLUME_FAST_HALF_LIFE, VOLUME_SLOW_HALF_LIFE = 1.0, 24.0
+FEATURE_RETENTION = timedelta(days=7)
+
+# Price-change periods published as priceChanges, by how far back they look
+PRICE_CHANGE_HORIZONS = {
+    'minutes15': timedelta(minutes=15),
+    'hour1': timedelta(hours=1),
+    'hours6': timedelta(hours=6),
+    'hours24': timedelta(hours=24),
+    'days3': timedelta(days=3),
+    'days7': timedelta(days=7),
+    'days30': timedelta(days=30),
+}
+# Each horizon reads the latest run up to this long after it, half the default run interval: run times are
+# truncated to the minute and jittered, so the run from 15 minutes ago often started just under 15 minutes ago
+HORIZON_GRACE = timedelta(minutes=7, seconds=30)
+# Published sparkline: the price on a grid of SPARKLINE_POINTS - 1 times over SPARKLINE_WINDOW, then the current
+# one. The grid is aligned to the epoch, so a series only changes when its price does or a grid time passes
+SPARKLINE_POINTS, SPARKLINE_WINDOW = 48, timedelta(days=7)
+
+# Publication order: weights of the RANKING_KEYS summed into each market's score; volume alone keeps the
+# highest-volume-first order. Caps on published markets, overall and per category; None means uncapped
+RANKING_WEIGHTS: dict[str, float] = {'volume': 1.0}
+MAX_PUBLISHED: int | None = None
+MAX_PER_CATEGORY: int | None = None
+
+# History tiers: raw 15-minute ticks, then hourly and daily OHLC rollups
+RAW_RETENTION, HOURLY_RETENTION, DAILY_RETENTION = timedelta(hours=48), timedelta(days=7), timedelta(days=365)
+ENDED_MARKET_RETENTION = timedelta(days=30)
+# Free pages returned to the filesystem per run
+INCREMENTAL_VACUUM_PAGES = 2048
+
+# Statement generation: prompt budget per chunk (~4 chars/token), reserved output per market
+STATEMENT_CHUNK_TOKENS, STATEMENT_OUTPUT_TOKENS = 6000, 40
+LLM_CONCURRENCY, LLM_RETRIES = 4, 2
+STATEMENT_CACHE_TTL = timedelta(days=30)
+# LLM backend unless LLM_BACKEND says otherwise: 'gemini', or 'local' for the offline stand-in
+DEFAULT_LLM_BACKEND = 'gemini'
+# Raw LLM responses by model, config and prompt; expired ones go first, then the oldest past the size budget
+LLM_CACHE_TTL, LLM_CACHE_MAX_BYTES = timedelta(days=7), 32 * 1024 * 1024
+# Shared by every LLM call: calls per second with bursts, and consecutive failures before the breaker opens
+LLM_RATE, LLM_BURST = 10.0, 20
+LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN = 5, timedelta(seconds=60)
+# Category of every statement from the local backend, so they are easy to spot and purge
+LOCAL_CATEGORY = 'Local'
+
+# Redundancy blocking: Jaccard threshold on question tokens, tokens shared by more markets are ignored
+REDUNDANCY_SIMILARITY, REDUNDANCY_MAX_POSTING, REDUNDANCY_CLUSTER_MAX = 0.4, 50, 25
+REDUNDANCY_CACHE_TTL = timedelta(days=7)
+# redundant_of value when the LLM did not name the implying market
+REDUNDANT_UNKNOWN = "redundant"
+
+DAEMON_JITTER = timedelta(seconds=30)
+
+# Pages the snapshot writer may fall behind the fetch before the fetch waits for it
+SNAPSHOT_QUEUE_PAGES = 8
+
+R2_CONCURRENCY = 8
+
+def parse_json_strings(v: Any) -> list[str]:
+    if isinstance(v, str):
+        parsed = json.loads(v)
+        if not isinstance(parsed, list):
+            raise ValueError("Must be a list")
+        return parsed
+    if isinstance(v, list):
+        return v
+    raise ValueError("Must be a list or JSON string")
+
+def validate_volume(v: Any) -> str | float:
+    if isinstance(v, (str, int, float)):
+        try:
+            float(v)
+            return v
+        except (ValueError, TypeError):
+            return "0"
+    return "0"
+
+class EventRecord(TypedDict):
+    title: NotRequired[str | None]
+    slug: NotRequired[str | None]
+
+class MarketRecord(TypedDict):
+    """One Gamma API market record, validated a page at a time.
+
+    Keeps only the fields the pipeline reads; everything else in the response is dropped during validation.
+    """
 
     id: str
     question: str
     endDateIso: str
     active: bool
     closed: bool
-    archived: bool | None = None
-    volume: str | float
-    liquidity: str | float | None = None
-    outcomePrices: list[str] | str
-    outcomes: list[str] | str
-    negRiskMarketID: str | None = None
-    events: list[dict[str, Any]] | None = None
-    slug: str | None = None
-    description: str | None = None
-
-    @field_validator('outcomePrices', 'outcomes', mode='before')
-    @classmethod
-    def parse_json_strings(cls, v: Any) -> list[str]:
-        if isinstance(v, str):
-            parsed = json.loads(v)
-            if not isinstance(parsed, list):
-                raise ValueError("Must be a list")
-            return parsed
-        if isinstance(v, list):
-            return v
-        raise ValueError("Must be a list or JSON string")
+    archived: NotRequired[bool | None]
+    volume: Annotated[str | float, BeforeValidator(validate_volume)]
+    liquidity: NotRequired[str | float | None]
+    outcomePrices: Annotated[list[str], BeforeValidator(parse_json_strings)]
+    outcomes: Annotated[list[str], BeforeValidator(parse_json_strings)]
+    negRiskMarketID: NotRequired[str | None]
+    events: NotRequired[list[EventRecord] | None]
+    slug: NotRequired[str | None]
+    description: NotRequired[str | None]
+    updatedAt: NotRequired[str | None]
+
+MARKET_RECORD = TypeAdapter(MarketRecord)
+MARKET_RECORDS = TypeAdapter(list[MarketRecord])
+
+def validate_page(body: bytes) -> list[dict[str, Any]] | None:
+    """Decode and validate a whole response body in one pass; None if any record is invalid."""
+    try:
+        return MARKET_RECORDS.validate_json(body)
+    except ValidationError:
+        return None
 
-    @field_validator('volume', mode='before')
-    @classmethod
-    def validate_volume(cls, v: Any) -> str | float:
-        if isinstance(v, (str, int, float)):
+def validate_records(records: list[dict[str, Any]]) -> list[tuple[int, dict[str, Any]]]:
+    """Validate decoded records in one call, falling back to one at a time to drop invalid ones.
+
+    Returns (index in `records`, validated dict) pairs.
+    """
+    try:
+        return list(enumerate(MARKET_RECORDS.validate_python(records)))
+    except ValidationError:
+        pass
+    validated = []
+    for i, record in enumerate(records):
+        try:
+            validated.append((i, MARKET_RECORD.validate_python(record)))
+        except ValidationError:
+            continue
+    return validated
+
+class Market:
+    """One market as the pipeline holds it: the fields it reads, with prices and sizes parsed once.
+
+    The filter stage fills in the most likely outcome, probability and features, later stages the
+    price changes, statement and category. `published()` is the only place the markets.json record
+    schema is spelled out; the raw_* fields keep the API's own values so it republishes them unchanged.
+    """
+
+    __slots__ = (
+        'id', 'question', 'slug', 'description', 'end_date', 'end_ts', 'active', 'closed', 'volume', 'liquidity',
+        'outcomes', 'prices', 'neg_risk_id', 'event_title', 'event_slug', 'raw_volume', 'raw_liquidity', 'raw_prices',
+        'most_likely_outcome', 'probability', 'features', 'price_changes', 'sparkline', 'statement', 'category',
+    )
+
+    def __init__(
+        self,
+        id: str,
+        question: str,
+        end_date: str | None,
+        active: bool,
+        closed: bool,
+        volume: float,
+        liquidity: float | None,
+        outcomes: tuple[str, ...],
+        prices: tuple[float, ...] | None,
+        slug: str | None = None,
+        description: str | None = None,
+        neg_risk_id: str | None = None,
+        event_title: str | None = None,
+        event_slug: str | None = None,
+        raw_volume: str | float | None = None,
+        raw_liquidity: str | float | None = None,
+        raw_prices: list[str] | None = None,
+    ) -> None:
+        self.id, self.question, self.slug, self.description = id, question, slug, description
+        self.end_date, self.active, self.closed = end_date, active, closed
+        self.volume, self.liquidity, self.outcomes, self.prices = volume, liquidity, outcomes, prices
+        self.neg_risk_id, self.event_title, self.event_slug = neg_risk_id, event_title, event_slug
+        self.raw_volume, self.raw_liquidity, self.raw_prices = raw_volume, raw_liquidity, raw_prices
+        self.end_ts = np.nan
+        if end_date:
             try:
-                float(v)
-                return v
-            except (ValueError, TypeError):
-                return "0"
-        return "0"
+                self.end_ts = parse_end_date(end_date).timestamp()
+            except (ValueError, TypeError, AttributeError):
+                pass
+        self.most_likely_outcome: str | None = None
+        self.probability: float | None = None
+        self.features: dict[str, float | None] | None = None
+        self.price_changes: dict[str, float | None] | None = None
+        self.sparkline: list[float | None] | None = None
+        self.statement: str | None = None
+        self.category: str | None = None
+
+    @classmethod
+    def from_record(cls, record: dict[str, Any]) -> 'Market':
+        """Build from a validated MarketRecord. Unparseable prices become None, unparseable sizes 0 or None."""
+        events = record.get('events')
+        event = events[0] if events else {}
+        try:
+            prices = tuple(float(p) for p in record['outcomePrices'])
+        except (ValueError, TypeError):
+            prices = None
+        return cls(
+            id=record['id'],
+            question=record['question'],
+            end_date=record.get('endDateIso'),
+            active=record['active'],
+            closed=record['closed'],
+            volume=parse_float(record.get('volume')) or 0.0,
+            liquidity=parse_float(record.get('liquidity')),
+            outcomes=tuple(record['outcomes']),
+            prices=prices,
+            slug=record.get('slug'),
+            description=record.get('description'),
+            neg_risk_id=record.get('negRiskMarketID'),
+            event_title=event.get('title'),
+            event_slug=event.get('slug'),
+            raw_volume=record['volume'],
+            raw_liquidity=record.get('liquidity'),
+            raw_prices=record['outcomePrices'],
+        )
+
+    def published(self) -> dict[str, Any]:
+        """The markets.json record, schema `PUBLISHED_SCHEMA_VERSION`.
+
+        Fields carried over from the API record keep its names and types: sizes as the API sent them,
+        outcomes and prices as lists of strings. Markets rebuilt from history (replay) have no raw values
+        and fall back to the parsed ones.
+        """
+        if self.raw_prices is not None:
+            prices = self.raw_prices
+        else:
+            prices = None if self.prices is None else [str(p) for p in self.prices]
+        return {
+            'id': self.id,
+            'question': self.question,
+            'slug': self.slug,
+            'description': self.description,
+            'endDateIso': self.end_date,
+            'active': self.active,
+            'closed': self.closed,
+            'volume': self.volume if self.raw_volume is None else self.raw_volume,
+            'liquidity': self.liquidity if self.raw_liquidity is None else self.raw_liquidity,
+            'outcomes': list(self.outcomes),
+            'outcomePrices': prices,
+            'negRiskMarketID': self.neg_risk_id,
+            'events': [{'title': self.event_title, 'slug': self.event_slug}] if self.event_title or self.event_slug else None,
+            'eventTitle': self.event_title,
+            'eventSlug': self.event_slug,
+            'mostLikelyOutcome': self.most_likely_outcome,
+            'currentProbability': self.probability,
+            'displayProbability': None if self.probability is None else round(self.probability),
+            'statement': self.statement,
+            'category': self.category,
+            'priceChanges': self.price_changes,
+            'sparkline': self.sparkline,
+            'features': self.features,
+        }
+
+def parse_float(value: Any) -> float | None:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+def markets_from_records(records: list[dict[str, Any]]) -> list[Market]:
+    """Validate decoded API-shaped records into Markets, skipping invalid ones."""
+    return [Market.from_record(record) for _, record in validate_records(records)]
+
+# Long-lived resources. The daemon keeps them across cycles; a one-shot run uses them once.
+_db: sqlite3.Connection | None = None
+_loop: asyncio.AbstractEventLoop | None = None
+_http_client: httpx.AsyncClient | None = None
+_genai_client: genai.Client | None = None
+_s3_client: Any = None
+_snapshot_state: tuple[dict[str, str], dict[str, tuple[Any, ...]]] | None = None
+
+def get_db() -> sqlite3.Connection:
+    """The process-wide SQLite connection, opened on first use."""
+    global _db
+    if _db is None:
+        _db = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT, check_same_thread=False)
+        configure_wal(_db)
+    return _db
+
+def configure_wal(conn: sqlite3.Connection) -> None:
+    # WAL lets the background snapshot writer and the main pipeline's reads proceed side by side.
+    # Checkpoints happen once per run in checkpoint_db, so the WAL frames count what the run wrote.
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA wal_autocheckpoint=0')
+    # Pages are committed as they stream in; in WAL mode NORMAL still never corrupts, it only skips the fsync per commit
+    conn.execute('PRAGMA synchronous=NORMAL')
+
+def checkpoint_db() -> int:
+    """Fold the WAL back into the database. Returns the bytes written to the WAL since the last checkpoint."""
+    conn = get_db()
+    _, frames, _ = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return max(frames, 0) * conn.execute('PRAGMA page_size').fetchone()[0]
+
+def close_db() -> None:
+    global _db, _snapshot_state
+    if _db is not None:
+        _db.close()
+        _db, _snapshot_state = None, None
+
+def run_async(coro: Any) -> Any:
+    """Run a coroutine on the daemon's event loop if there is one, else on a fresh loop."""
+    if _loop is not None:
+        return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+    return asyncio.run(coro)
+
+def get_genai_client(api_key: str) -> genai.Client:
+    # Async genai clients are bound to their event loop, so only the daemon's persistent loop can share one
+    global _genai_client
+    if _loop is None:
+        return genai.Client(api_key=api_key)
+    if _genai_client is None:
+        _genai_client = genai.Client(api_key=api_key)
+    return _genai_client
 
 def init_database() -> None:
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS snapshots (
-            timestamp TEXT PRIMARY KEY,
-            markets_json TEXT NOT NULL,
+        CREATE TABLE IF NOT EXISTS snapshot_runs (
+            ts TEXT PRIMARY KEY,
+            market_count INTEGER NOT NULL,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON snapshots(timestamp)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS market_meta (
+            market_id TEXT PRIMARY KEY,
+            meta_hash TEXT NOT NULL,
+            question TEXT,
+            slug TEXT,
+            description TEXT,
+            end_date TEXT,
+            neg_risk_market_id TEXT,
+            outcomes TEXT,
+            event_title TEXT,
+            event_slug TEXT,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    # One row per market per run in which its prices, volume or liquidity changed
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_ticks (
+            market_id TEXT NOT NULL,
+            ts TEXT NOT NULL,
+            prices TEXT NOT NULL,
+            volume REAL,
+            liquidity REAL,
+            PRIMARY KEY (market_id, ts)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_ticks_ts ON price_ticks(ts)')
+    # Ticks past RAW_RETENTION folded into hourly, then daily buckets; OHLC of the first outcome's price,
+    # plus the closing prices, volume and liquidity. Like ticks, a bucket exists only if something changed.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_rollups (
+            market_id TEXT NOT NULL,
+            resolution TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            prices TEXT NOT NULL,
+            volume REAL,
+            liquidity REAL,
+            PRIMARY KEY (market_id, resolution, bucket)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_rollups_bucket ON price_rollups(resolution, bucket)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS latest_ticks (
+            market_id TEXT PRIMARY KEY,
+            ts TEXT NOT NULL,
+            prices TEXT NOT NULL,
+            volume REAL,
+            liquidity REAL
+        ) WITHOUT ROWID
+    ''')
+    # Running per-market signals, updated in place every run
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS market_features (
+            market_id TEXT PRIMARY KEY,
+            updated_at REAL NOT NULL,
+            last_price REAL NOT NULL,
+            last_volume REAL NOT NULL,
+            momentum_1h REAL NOT NULL,
+            momentum_6h REAL NOT NULL,
+            momentum_24h REAL NOT NULL,
+            variance REAL NOT NULL,
+            volume_rate_fast REAL NOT NULL,
+            volume_rate_slow REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS statement_cache (
+            market_id TEXT NOT NULL,
+            outcome TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            statement TEXT NOT NULL,
+            category TEXT NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (market_id, outcome, content_hash)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_statement_cache_last_used ON statement_cache(last_used)')
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS redundancy_cache (
             market_id TEXT PRIMARY KEY,
             redundant_of TEXT,
             reason TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            question_hash TEXT
+        )
+    ''')
+    if 'question_hash' not in {row[1] for row in cursor.execute('PRAGMA table_info(redundancy_cache)')}:
+        cursor.execute('ALTER TABLE redundancy_cache ADD COLUMN question_hash TEXT')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_redundancy_cache_created_at ON redundancy_cache(created_at)')
+    # Parsed LLM responses as JSON, keyed by a hash of model, config and prompt
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache(created_at)')
+    # Content hash of the last version of each published object that reached R2
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS publish_state (
+            object_key TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            published_at TEXT NOT NULL
         )
     ''')
+    # One JSON metrics record per run; query with json_extract(metrics, '$.stages.fetch')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS run_metrics (
+            ts TEXT PRIMARY KEY,
+            total_seconds REAL,
+            error TEXT,
+            metrics TEXT NOT NULL
+        )
+    ''')
+    # Per-record hashes of the last markets.json version, the base of the next delta
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS published_records (
+            market_id TEXT PRIMARY KEY,
+            record_hash TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.commit()
+    migrate_legacy_snapshots(conn)
+    seed_statement_cache(conn)
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        # Switching an existing database to incremental vacuum takes one full VACUUM; it runs after the
+        # legacy snapshots are dropped so it neither copies them nor leaves their pages to reclaim
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+
+def migrate_legacy_snapshots(conn: sqlite3.Connection) -> None:
+    """Replay old whole-run `snapshots` blobs into the normalized store, then drop them."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'snapshots'").fetchone():
+        return
+    timestamps = [row[0] for row in conn.execute('SELECT timestamp FROM snapshots ORDER BY timestamp')]
+    for ts in timestamps:
+        markets_json = conn.execute('SELECT markets_json FROM snapshots WHERE timestamp = ?', (ts,)).fetchone()[0]
+        try:
+            write_snapshot(conn, markets_from_records(json.loads(markets_json)), ts)
+        except json.JSONDecodeError:
+            continue
+    conn.execute('DROP TABLE snapshots')
     conn.commit()
-    conn.close()
+    if timestamps:
+        print(f"Migrated {len(timestamps)} legacy snapshots to normalized store")
+
+PRICE_KEY_STRIP = str.maketrans('', '', '[]" ')
+
+def record_fingerprint(raw: dict[str, Any]) -> Any:
+    """Change key for an API record: `updatedAt` plus the fast-moving fields, or a hash of the whole record.
+
+    Raw and validated forms of the same record give the same key when `updatedAt` is present.
+    """
+    if raw.get('updatedAt'):
+        prices = raw.get('outcomePrices')
+        prices_key = ','.join(map(str, prices)) if isinstance(prices, list) else str(prices).translate(PRICE_KEY_STRIP)
+        return (raw['updatedAt'], prices_key, str(raw.get('volume')), str(raw.get('liquidity')),
+                raw.get('active'), raw.get('closed'))
+    return hashlib.blake2b(json.dumps(raw, sort_keys=True, default=str).encode(), digest_size=16).digest()
+
+class MarketRecordCache:
+    """Markets from the previous fetch, reused while their API record is unchanged.
+
+    Lives for the process and only fills when `enabled` (daemon mode): a one-shot run could never reuse
+    it, so holding every record would only cost memory.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.records: dict[str, tuple[Any, Market]] = {}
+        self.unchanged: set[str] = set()
+        self.seen: set[str] = set()
+
+    def begin_run(self) -> None:
+        self.unchanged, self.seen = set(), set()
+
+    def end_run(self) -> None:
+        self.records = {mid: r for mid, r in self.records.items() if mid in self.seen}
+
+    def lookup(self, raw: dict[str, Any], fingerprint: Any) -> Market | None:
+        entry = self.records.get(raw.get('id'))
+        if entry and entry[0] == fingerprint:
+            self.unchanged.add(raw['id'])
+            self.seen.add(raw['id'])
+            return entry[1]
+        return None
+
+    def store(self, fingerprint: Any, market: Market) -> None:
+        if self.enabled:
+            self.records[market.id] = (fingerprint, market)
+            self.seen.add(market.id)
+
+_record_cache = MarketRecordCache()
+
+class FetchReport(BaseModel):
+    retried: dict[int, int] = {}
+    lost: list[int] = []
+    pages: int = 0
+    latencies: list[float] = []
+
+class LLMStats(BaseModel):
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+
+class CacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+
+    @computed_field
+    @property
+    def hit_rate(self) -> float | None:
+        total = self.hits + self.misses
+        return round(self.hits / total, 4) if total else None
+
+class RunMetrics(BaseModel):
+    """Machine-readable record of one pipeline run; written by write_metrics."""
+    ts: str = ''
+    error: str | None = None
+    stages: dict[str, float] = {}
+    markets_fetched: int = 0
+    markets_published: int = 0
+    http_pages: int = 0
+    http_retries: int = 0
+    http_lost_pages: int = 0
+    http_latency: dict[str, float] = {}
+    llm: dict[str, LLMStats] = {}
+    caches: dict[str, CacheStats] = {}
+    sqlite_rows_written: int = 0
+    sqlite_bytes_written: int = 0
+    peak_rss_bytes: int = 0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(self.stages.get(name, 0.0) + time.perf_counter() - started, 4)
+
+    def record_fetch(self, report: FetchReport) -> None:
+        self.http_pages = report.pages
+        self.http_retries = sum(report.retried.values())
+        self.http_lost_pages = len(report.lost)
+        if report.latencies:
+            latencies = np.array(report.latencies)
+            self.http_latency = {
+                'p50': round(float(np.percentile(latencies, 50)), 4),
+                'p95': round(float(np.percentile(latencies, 95)), 4),
+                'max': round(float(latencies.max()), 4),
+            }
+
+    def record_llm(self, kind: str, seconds: float, reply: 'LLMReply') -> None:
+        stats = self.llm.setdefault(kind, LLMStats())
+        stats.calls += 1
+        stats.seconds = round(stats.seconds + seconds, 4)
+        stats.prompt_tokens += reply.prompt_tokens
+        stats.response_tokens += reply.response_tokens
+
+    def record_llm_error(self, kind: str) -> None:
+        self.llm.setdefault(kind, LLMStats()).errors += 1
+
+    def record_cache(self, name: str, hits: int, misses: int) -> None:
+        stats = self.caches.setdefault(name, CacheStats())
+        stats.hits += hits
+        stats.misses += misses
+
+_metrics = RunMetrics()
+
+class ConcurrencyWindow:
+    """AIMD window: grow by one on success, halve on throttling."""
+
+    def __init__(self, initial: int, maximum: int) -> None:
+        self.size, self.maximum = initial, maximum
+
+    def grow(self) -> None:
+        self.size = min(self.maximum, self.size + 1)
+
+    def shrink(self) -> None:
+        self.size = max(1, self.size // 2)
+
+def make_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=10),
+        limits=httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY, keepalive_expiry=60),
+    )
 
-async def fetch_page(client: httpx.AsyncClient, offset: int, limit: int) -> tuple[list[dict[str, Any]], int]:
+def retry_delay(response: httpx.Response | None, attempt: int) -> float:
+    if response is not None and (value := response.headers.get('Retry-After')):
+        try:
+            return min(RETRY_AFTER_MAX, max(0.0, float(value)))
+        except ValueError:
+            try:
+                return min(RETRY_AFTER_MAX, max(0.0, (parsedate_to_datetime(value) - datetime.now(UTC)).total_seconds()))
+            except (TypeError, ValueError):
+                pass
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+async def fetch_page(
+    client: httpx.AsyncClient,
+    offset: int,
+    limit: int,
+    report: FetchReport | None = None,
+    window: ConcurrencyWindow | None = None,
+) -> tuple[list[Market], int] | None:
+    """Fetch one page with retries; returns None if the page is lost."""
     params = {'limit': limit, 'offset': offset, 'active': 'true', 'closed': 'false', 'archived': 'false'}
-    try:
-        response = await client.get(API_URL, params=params, timeout=30)
-        response.raise_for_status()
-        raw_data = response.json()
-        validated_markets = []
-        for market_data in raw_data:
+    for attempt in range(MAX_RETRIES + 1):
+        response = None
+        try:
+            started = time.perf_counter()
             try:
-                validated_markets.append(PolymarketMarket(**market_data).model_dump())
-            except ValidationError:
-                continue
-        return validated_markets, len(raw_data)
-    except (httpx.HTTPError, json.JSONDecodeError) as e:
-        print(f"❌ Error fetching page at offset {offset}: {e}")
-        return [], 0
-
-async def fetch_all_markets_async() -> list[dict[str, Any]]:
+                response = await client.get(API_URL, params=params)
+            finally:
+                if report:
+                    report.latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+            if not _record_cache.records:
+                # Cold cache: nothing to reuse, so validate straight from the response bytes
+                page = validate_page(response.content)
+                if page is not None:
+                    markets = [Market.from_record(record) for record in page]
+                    if _record_cache.enabled:
+                        for record, market in zip(page, markets):
+                            _record_cache.store(record_fingerprint(record), market)
+                    if window:
+                        window.grow()
+                    return markets, len(page)
+            raw_data = json.loads(response.content)
+            validated_markets: list[Market | None] = [None] * len(raw_data)
+            fingerprints, changed = [], []
+            for i, market_data in enumerate(raw_data):
+                fingerprint = record_fingerprint(market_data)
+                fingerprints.append(fingerprint)
+                validated_markets[i] = _record_cache.lookup(market_data, fingerprint)
+                if validated_markets[i] is None:
+                    changed.append(i)
+            for k, record in validate_records([raw_data[i] for i in changed]):
+                market = Market.from_record(record)
+                _record_cache.store(fingerprints[changed[k]], market)
+                validated_markets[changed[k]] = market
+            validated_markets = [m for m in validated_markets if m is not None]
+            if window:
+                window.grow()
+            return validated_markets, len(raw_data)
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            status = response.status_code if response is not None else None
+            throttled = status == 429 or isinstance(e, httpx.TimeoutException)
+            retryable = throttled or isinstance(e, (httpx.TransportError, json.JSONDecodeError)) or (status is not None and status >= 500)
+            if window and throttled:
+                window.shrink()
+            if not retryable or attempt == MAX_RETRIES:
+                print(f"❌ Error fetching page at offset {offset} after {attempt + 1} attempt(s): {e}")
+                if report:
+                    report.lost.append(offset)
+                return None
+            if report:
+                report.retried[offset] = attempt + 1
+            await asyncio.sleep(retry_delay(response, attempt))
+    return None
+
+async def fetch_pages_async() -> AsyncIterator[tuple[int, list[Market]]]:
+    """Yield (offset, validated markets) for each page as soon as it arrives, in completion order."""
     print("🔍 Fetching markets from Polymarket API...")
-    limit, max_offset = 100, 500
-
-    async with httpx.AsyncClient() as client:
-        first_page, first_count = await fetch_page(client, 0, limit)
-        if not first_page and first_count == 0:
-            return []
-
-        all_markets = first_page
-        print(f"  📊 Fetched first page: {len(first_page)} valid markets ({first_count} returned by API)")
-
-        if first_count == limit:
-            tasks = [fetch_page(client, offset, limit) for offset in range(limit, max_offset + 1, limit)]
-            for i, (page_markets, page_count) in enumerate(await asyncio.gather(*tasks)):
-                if page_count > 0:
-                    all_markets.extend(page_markets)
-                    print(f"  📊 Fetched page {i+2}: {len(page_markets)} valid markets ({page_count} from API, total: {len(all_markets)} valid)")
-                    if page_count < limit:
-                        break
-                else:
-                    break
-    return all_markets
-
-def fetch_all_markets() -> list[dict[str, Any]]:
-    return asyncio.run(fetch_all_markets_async())
-
-def load_historical_snapshots() -> dict[str, str | dict[str, Any] | None]:
-    snapshots: dict[str, str | dict[str, Any] | None] = {'hour1': None, 'hours24': None, 'days7': None}
-    if not os.path.exists(DB_FILE):
-        return snapshots
+    report = FetchReport()
+    window = ConcurrencyWindow(INITIAL_CONCURRENCY, MAX_CONCURRENCY)
+    in_flight: dict[asyncio.Task, int] = {}
+    next_offset, end_offset, consecutive_lost, valid = 0, None, 0, 0
+    _record_cache.begin_run()
 
-    now = datetime.now(UTC)
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM snapshots')
-    total_snapshots = cursor.fetchone()[0]
+    client = _http_client or make_http_client()
+    try:
+        while True:
+            # Keep scheduling offsets until a short page marks the end of the listing
+            while end_offset is None and consecutive_lost < MAX_CONCURRENCY and len(in_flight) < window.size:
+                task = asyncio.create_task(fetch_page(client, next_offset, PAGE_LIMIT, report, window))
+                in_flight[task] = next_offset
+                next_offset += PAGE_LIMIT
+            if not in_flight:
+                break
 
-    min_ages = {'hour1': timedelta(hours=1), 'hours24': timedelta(hours=24), 'days7': timedelta(days=7)}
-    cursor.execute('SELECT timestamp, markets_json FROM snapshots ORDER BY timestamp DESC')
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                offset = in_flight.pop(task)
+                result = task.result()
+                if result is None:
+                    consecutive_lost += 1
+                    continue
+                consecutive_lost = 0
+                page_markets, page_count = result
+                report.pages += 1
+                valid += len(page_markets)
+                if page_count < PAGE_LIMIT and (end_offset is None or offset < end_offset):
+                    end_offset = offset
+                if page_count:
+                    print(f"  📊 Fetched page {offset // PAGE_LIMIT + 1}: {len(page_markets)} valid markets ({page_count} from API, window: {window.size})")
+                    yield offset, page_markets
+    finally:
+        if client is not _http_client:
+            await client.aclose()
+
+    if end_offset is not None:
+        report.lost = sorted(o for o in report.lost if o < end_offset)
+    _record_cache.end_run()
+    _metrics.record_fetch(report)
+    print(f"  ✓ {valid} valid markets from {report.pages} pages ({len(_record_cache.unchanged)} unchanged since last fetch)")
+    if report.retried:
+        print(f"  🔁 Retried pages (offset: attempts): {dict(sorted(report.retried.items()))}")
+    if report.lost:
+        print(f"  ⚠️  Lost pages (offsets): {report.lost}")
+
+async def stream_markets_async(stream: 'MarketStream') -> None:
+    async with aclosing(fetch_pages_async()) as pages:
+        async for offset, page in pages:
+            # Off the loop: handing the page to a full snapshot queue and the features write block, and
+            # in-flight requests must keep running meanwhile. The generator waits at its yield, so no new
+            # pages are scheduled until the page is taken
+            await asyncio.to_thread(stream.add, offset, page)
+
+def fetch_markets(now: datetime, snapshot: 'SnapshotWriter | None' = None) -> 'MarketStream':
+    """Fetch every page through the basic filters, handing each page to `snapshot` as it arrives."""
+    stream = MarketStream(now, snapshot)
+    run_async(stream_markets_async(stream))
+    return stream
+
+# Each market's prices at each time in :times (a JSON array of SNAPSHOT_TS_FORMAT strings): the time first
+# moves back to the latest run at or before it, then each (market, run) pair is an index seek into the raw
+# ticks, then the hourly and daily rollups that had closed by then. A rollup is keyed by its bucket's start
+# but holds its close. One row per time that has a run (with NULL ids when :ids is empty), NULL prices before
+# a market's first tick
+PRICES_AT_SQL = '''
+    WITH runs AS MATERIALIZED (
+        SELECT key, (SELECT MAX(ts) FROM snapshot_runs WHERE ts <= value) AS ts FROM json_each(:times)
+    )
+    SELECT ids.key AS row, ids.value AS market_id, runs.key AS col, runs.ts AS ts, COALESCE(
+        (SELECT prices FROM price_ticks
+         WHERE market_id = ids.value AND ts <= runs.ts ORDER BY ts DESC LIMIT 1),
+        (SELECT prices FROM price_rollups
+         WHERE market_id = ids.value AND resolution = 'hour' AND bucket < substr(runs.ts, 1, 13) || '-00'
+         ORDER BY bucket DESC LIMIT 1),
+        (SELECT prices FROM price_rollups
+         WHERE market_id = ids.value AND resolution = 'day' AND bucket < substr(runs.ts, 1, 10) || '_00-00'
+         ORDER BY bucket DESC LIMIT 1)
+    ) AS prices FROM runs LEFT JOIN json_each(:ids) ids WHERE runs.ts IS NOT NULL
+'''
+
+def prices_at_params(market_ids: list[str], timestamps: list[datetime]) -> dict[str, str]:
+    return {'ids': json.dumps(market_ids), 'times': json.dumps([t.strftime(SNAPSHOT_TS_FORMAT) for t in timestamps])}
+
+def as_of(
+    timestamp: datetime,
+    market_ids: list[str],
+    conn: sqlite3.Connection | None = None,
+) -> tuple[str | None, dict[str, list[float]]]:
+    """Prices of `market_ids` in the latest snapshot at or before `timestamp`.
+
+    Returns the snapshot timestamp (None if there is none) and the prices of the requested markets
+    that had a tick by then. Past RAW_RETENTION they are only as precise as their rollup bucket.
+    """
+    conn = conn or get_db()
+    snapshot_ts, prices = None, {}
+    for _, mid, _, snapshot_ts, row_prices in conn.execute(PRICES_AT_SQL, prices_at_params(market_ids, [timestamp])):
+        if row_prices is not None:
+            prices[mid] = json.loads(row_prices)
+    return snapshot_ts, prices
+
+def history_timestamps(now: datetime, sparkline: bool = True) -> list[datetime]:
+    """The times historical_prices looks up: one per PRICE_CHANGE_HORIZONS period (plus HORIZON_GRACE), then the sparkline grid."""
+    times = [now - age + HORIZON_GRACE for age in PRICE_CHANGE_HORIZONS.values()]
+    if sparkline:
+        step = SPARKLINE_WINDOW.total_seconds() / SPARKLINE_POINTS
+        last = now.timestamp() // step * step
+        times += [datetime.fromtimestamp(last - k * step, UTC) for k in range(SPARKLINE_POINTS - 2, -1, -1)]
+    return times
+
+def historical_prices(
+    market_ids: list[str],
+    timestamps: list[datetime],
+    conn: sqlite3.Connection,
+) -> np.ndarray:
+    """The first outcome's price of each market at each of `timestamps`, NaN before its first tick.
+
+    One query for all markets and times, as for as_of; past RAW_RETENTION a price is only as precise
+    as its bucket.
+    """
+    past = np.full((len(market_ids), len(timestamps)), np.nan)
+    if not market_ids or not timestamps:
+        return past
+    rows = conn.execute(
+        f"SELECT row, col, json_extract(prices, '$[0]') FROM ({PRICES_AT_SQL})",
+        prices_at_params(market_ids, timestamps),
+    )
+    for i, j, price in rows:
+        if price is not None:
+            past[i, j] = price
+    return past
+
+def load_historical_prices(market_ids: list[str]) -> np.ndarray:
+    """historical_prices at history_timestamps(now): the horizons' columns first, then the sparkline grid."""
+    timestamps = history_timestamps(datetime.now(UTC))
+    if not os.path.exists(DB_FILE):
+        return np.full((len(market_ids), len(timestamps)), np.nan)
 
-    for timestamp_str, markets_json in cursor.fetchall():
-        try:
-            snapshot_time = datetime.strptime(timestamp_str, '%Y-%m-%d_%H-%M').replace(tzinfo=UTC)
-            age = now - snapshot_time
-            for period, min_age in min_ages.items():
-                if snapshots[period] is None and age >= min_age:
-                    markets_list = json.loads(markets_json)
-                    snapshots[period] = {
-                        'timestamp': timestamp_str,
-                        'markets': {m.get('id'): m for m in markets_list if m.get('id')}
-                    }
-            if all(snapshots.values()):
-                break
-        except (ValueError, json.JSONDecodeError):
-            continue
+    conn = get_db()
+    total_snapshots = conn.execute('SELECT COUNT(*) FROM snapshot_runs').fetchone()[0]
+    past = historical_prices(market_ids, timestamps, conn)
 
-    conn.close()
-    loaded = [k for k, v in snapshots.items() if v is not None]
+    loaded = [period for j, period in enumerate(PRICE_CHANGE_HORIZONS) if not np.isnan(past[:, j]).all()]
     if loaded:
-        print(f"Loaded snapshots: {', '.join(loaded)} (total: {total_snapshots})")
+        print(f"Loaded price history: {', '.join(loaded)} (total: {total_snapshots} snapshots)")
     elif total_snapshots > 0:
         print(f"No snapshots old enough yet ({total_snapshots} snapshots = {total_snapshots * 0.25:.1f}hr history)")
-    return snapshots
+    return past
 
-def get_most_likely_outcome(market: dict[str, Any]) -> tuple[str | None, float | None]:
-    outcomes, prices = market.get('outcomes'), market.get('outcomePrices')
-    if not outcomes or not prices:
-        return None, None
-    try:
-        if isinstance(outcomes, str):
-            outcomes = json.loads(outcomes)
-        if isinstance(prices, str):
-            prices = json.loads(prices)
-        if not isinstance(outcomes, list) or not isinstance(prices, list) or len(outcomes) != len(prices):
-            return None, None
-        max_prob, max_outcome = 0, None
-        for outcome, price in zip(outcomes, prices):
-            prob = float(price) * 100
-            if prob > max_prob:
-                max_prob, max_outcome = prob, outcome
-        return max_outcome, max_prob
-    except (ValueError, TypeError, IndexError, json.JSONDecodeError):
-        return None, None
+def parse_end_date(end_date_str: str) -> datetime:
+    return datetime.fromisoformat(
+        end_date_str.replace('Z', '+00:00') if 'T' in end_date_str else end_date_str + 'T00:00:00+00:00'
+    )
+
+class MarketFrame:
+    """Columnar view of one fetch. Every field is parsed once; filters run as array ops."""
+
+    def __init__(self, markets: list[Market]) -> None:
+        n = len(markets)
+        self.markets = markets
+        self.ids: list[str | None] = [m.id for m in markets]
+        self.row_of = {mid: i for i, mid in enumerate(self.ids) if mid}
+        self.outcomes: list[tuple[str, ...]] = [m.outcomes for m in markets]
+        self.active = np.fromiter((m.active for m in markets), dtype=bool, count=n)
+        self.closed = np.fromiter((m.closed for m in markets), dtype=bool, count=n)
+        self.has_end = np.fromiter((bool(m.end_date) for m in markets), dtype=bool, count=n)
+        self.volume = np.fromiter((m.volume for m in markets), dtype=float, count=n)
+        self.liquidity = np.fromiter((m.liquidity or 0.0 for m in markets), dtype=float, count=n)
+        self.end_ts = np.fromiter((m.end_ts for m in markets), dtype=float, count=n)
+        # Prices count only when there is one per outcome
+        rows = [m.prices if m.outcomes and m.prices and len(m.prices) == len(m.outcomes) else None for m in markets]
+
+        # Outcome prices padded to a rectangle; -inf never wins the argmax
+        width = max((len(r) for r in rows if r), default=1)
+        self.prices = np.full((n, width), -np.inf)
+        for i, row in enumerate(rows):
+            if row:
+                self.prices[i, :len(row)] = row
+        self.best = self.prices.argmax(axis=1) if n else np.zeros(0, dtype=int)
+        self.probability = self.prices.max(axis=1) * 100 if n else np.zeros(0)
+        self.price_ok = np.isfinite(self.probability) & (self.probability > 0)
+        self.no_column = np.fromiter(
+            (o.index('No') if o and 'No' in o else -1 for o in self.outcomes), dtype=int, count=n,
+        )
+
+    def most_likely_outcome(self, i: int) -> str:
+        return self.outcomes[i][self.best[i]]
+
+    def annotate(self, i: int) -> Market:
+        """Set the most likely outcome and its probability on row `i`'s market, and return it."""
+        market = self.markets[i]
+        market.most_likely_outcome = self.most_likely_outcome(i)
+        market.probability = float(self.probability[i])
+        return market
+
+    def basic_filter(self, now: datetime) -> tuple[np.ndarray, dict[str, int]]:
+        """Indices passing the active/closed/date-range/outcome/probability filters, plus skip counts."""
+        days_until_end = np.floor((self.end_ts - now.timestamp()) / 86400)
+        with np.errstate(invalid='ignore'):
+            in_range = (days_until_end > 0) & (days_until_end <= 90)
+        is_no = self.best == self.no_column
+
+        live = self.has_end & self.active & ~self.closed
+        dated = live & ~np.isnan(self.end_ts)
+        priced = dated & in_range & self.price_ok
+        yes = priced & ~is_no
+        keep = yes & (self.probability >= 55)
+
+        skip_reasons = {
+            'no_end_date': int((~self.has_end).sum()),
+            'inactive': int((self.has_end & ~self.active).sum()),
+            'closed': int((self.has_end & self.active & self.closed).sum()),
+            'date_range': int((dated & ~in_range).sum()),
+            'outcome_no': int((priced & is_no).sum()),
+            'prob_low': int((yes & ~keep).sum()),
+            'parse_err': int((live & ~dated).sum() + (dated & in_range & ~self.price_ok).sum()),
+        }
+        return np.flatnonzero(keep), skip_reasons
 
 class MarketInput(BaseModel):
     question: str
@@ -201,39 +995,15 @@ class MarketStatement(BaseModel):
     statement: str
     category: str
 
+class IndexedStatement(MarketStatement):
+    index: int
+
 class RedundancyResult(BaseModel):
     redundant_market_ids: list[str]
     reasoning: list[str]
+    implied_by: list[str] = []
 
-def generate_statements(markets: list[dict[str, Any]]) -> list[MarketStatement]:
-    """Use LLM to convert questions to declarative statements"""
-    if not markets:
-        return []
-
-    # Load API key from environment
-    api_key = os.getenv('GOOGLE_API_KEY')
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY not found in environment")
-
-    # Prepare input data
-    market_inputs = []
-    for market in markets:
-        most_likely_outcome, probability = get_most_likely_outcome(market)
-        if most_likely_outcome and probability is not None:
-            events = market.get('events')
-            event_title = events[0].get('title') if events and isinstance(events, list) and events else None
-            market_inputs.append(MarketInput(
-                question=market.get('question', ''),
-                most_likely_outcome=most_likely_outcome,
-                probability=probability,
-                event_title=event_title
-            ))
-
-    if not market_inputs:
-        return []
-
-    # Create prompt for batch processing
-    prompt = """Convert each prediction market question into a concise declarative statement and classify its category.
+STATEMENT_PROMPT = """Convert each prediction market question into a concise declarative statement and classify its category.
 
 Rules:
 - Convert question to short affirmative statement: "[subject] will [verb]"
@@ -264,92 +1034,403 @@ Examples:
 - Question: "Will Luigi Mangione be found guilty?" → Statement: "Luigi Mangione will be found guilty." Category: "Legal"
 - Question: "Will no CEO be announced in 2025?", Event: "Who will replace Musk as Tesla CEO?" → Statement: "No Musk replacement as Tesla CEO will be announced in 2025." Category: "Business"
 
+Return one object per market with its number as `index`.
+
 Markets to convert:
 """
 
-    # Add market data to prompt
-    for i, m in enumerate(market_inputs, 1):
-        prompt += f"\n{i}. Question: {m.question}"
-        if m.event_title and m.event_title != m.question:
-            prompt += f"\n   Event: {m.event_title}"
-        prompt += f"\n   Outcome: {m.most_likely_outcome} ({m.probability:.1f}%)\n"
+def fallback_statement(market: Market) -> MarketStatement:
+    return MarketStatement(statement=f"{market.question.rstrip('?')}.", category='Uncategorized')
 
-    try:
-        client = genai.Client(api_key=api_key)
-        response = client.models.generate_content(
-            model=MODEL,
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def market_input(market: Market) -> MarketInput | None:
+    if not market.most_likely_outcome or market.probability is None:
+        return None
+    return MarketInput(
+        question=market.question,
+        most_likely_outcome=market.most_likely_outcome,
+        probability=market.probability,
+        event_title=market.event_title
+    )
+
+# One market in a statement prompt, as written by format_statement_item
+STATEMENT_ITEM = re.compile(r'^(\d+)\. Question: (.*)$', re.MULTILINE)
+
+def format_statement_item(index: int, m: MarketInput) -> str:
+    item = f"\n{index}. Question: {m.question}"
+    if m.event_title and m.event_title != m.question:
+        item += f"\n   Event: {m.event_title}"
+    return item + f"\n   Outcome: {m.most_likely_outcome} ({m.probability:.1f}%)\n"
+
+def chunk_statement_inputs(inputs: list[tuple[int, MarketInput]]) -> list[list[tuple[int, MarketInput]]]:
+    """Split inputs into chunks whose prompt stays within STATEMENT_CHUNK_TOKENS."""
+    chunks: list[list[tuple[int, MarketInput]]] = [[]]
+    budget = STATEMENT_CHUNK_TOKENS - estimate_tokens(STATEMENT_PROMPT)
+    used = 0
+    for i, m in inputs:
+        cost = estimate_tokens(format_statement_item(i, m)) + STATEMENT_OUTPUT_TOKENS
+        if chunks[-1] and used + cost > budget:
+            chunks.append([])
+            used = 0
+        chunks[-1].append((i, m))
+        used += cost
+    return chunks
+
+class LLMReply(NamedTuple):
+    parsed: Any
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+
+class LLMUnavailable(Exception):
+    """Raised instead of calling the LLM while the circuit breaker is open."""
+
+class LLMBackend(ABC):
+    """Where structured LLM calls go. `model` is part of every response cache key."""
+    model: str
+
+    @abstractmethod
+    async def generate(self, prompt: str, schema: Any, temperature: float) -> LLMReply:
+        ...
+
+class GeminiBackend(LLMBackend):
+    def __init__(self, api_key: str, model: str = MODEL) -> None:
+        self.api_key, self.model = api_key, model
+
+    async def generate(self, prompt: str, schema: Any, temperature: float) -> LLMReply:
+        response = await get_genai_client(self.api_key).aio.models.generate_content(
+            model=self.model,
             contents=prompt,
-            config={
-                "response_mime_type": "application/json",
-                "response_schema": list[MarketStatement],
-                "temperature": 0.3,  # Lower temperature for more consistent output
-            },
+            config={"response_mime_type": "application/json", "response_schema": schema, "temperature": temperature},
+        )
+        usage = getattr(response, 'usage_metadata', None)
+        return LLMReply(
+            response.parsed,
+            getattr(usage, 'prompt_token_count', None) or 0,
+            getattr(usage, 'candidates_token_count', None) or 0,
+        )
+
+class LocalBackend(LLMBackend):
+    """Offline, deterministic stand-in: each question becomes its statement, and nothing is redundant.
+
+    Its statements are categorised LOCAL_CATEGORY and still land in statement_cache, so point a load
+    test at its own database.
+    """
+    model = 'local'
+
+    async def generate(self, prompt: str, schema: Any, temperature: float) -> LLMReply:
+        if schema is RedundancyResult:
+            return LLMReply(RedundancyResult(redundant_market_ids=[], reasoning=[]))
+        return LLMReply([
+            IndexedStatement(index=int(index), statement=question.rstrip('?') + '.', category=LOCAL_CATEGORY)
+            for index, question in STATEMENT_ITEM.findall(prompt)
+        ])
+
+def get_llm_backend() -> LLMBackend:
+    """The backend named by LLM_BACKEND. Raises ValueError if it is unknown or not configured."""
+    name = os.getenv('LLM_BACKEND', DEFAULT_LLM_BACKEND)
+    if name == 'local':
+        return LocalBackend()
+    if name != 'gemini':
+        raise ValueError(f"Unknown LLM_BACKEND {name!r}, expected 'gemini' or 'local'")
+    api_key = os.getenv('GOOGLE_API_KEY')
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY not found in environment")
+    return GeminiBackend(api_key)
+
+class RateLimiter:
+    """Token bucket shared across threads and event loops: `rate` calls per second, in bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.interval, self.burst = 1 / rate, burst
+        self.lock = threading.Lock()
+        self.due = 0.0
+
+    def delay(self) -> float:
+        """Claim the next call slot; returns how long to wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.due = max(self.due, now) + self.interval
+            return max(0.0, self.due - self.burst * self.interval - now)
+
+class CircuitBreaker:
+    """Fails calls fast after `threshold` consecutive failures.
+
+    After `cooldown` a single trial call goes through; its success closes the breaker, its failure
+    opens it for another cooldown.
+    """
+
+    def __init__(self, threshold: int, cooldown: timedelta) -> None:
+        self.threshold, self.cooldown = threshold, cooldown.total_seconds()
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial = False
+
+    def allow(self) -> None:
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if self.trial or time.monotonic() - self.opened_at < self.cooldown:
+                raise LLMUnavailable(f"LLM circuit open after {self.failures} consecutive failures")
+            self.trial = True
+
+    def record(self, ok: bool) -> None:
+        with self.lock:
+            self.trial = False
+            if ok:
+                self.failures, self.opened_at = 0, None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+# Process-wide, so the daemon's cycles and both LLM stages share one budget and one view of the backend's health
+_llm_limiter = RateLimiter(LLM_RATE, LLM_BURST)
+_llm_breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+
+@functools.cache
+def llm_adapter(schema: Any) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+def llm_cache_key(model: str, schema: Any, temperature: float, prompt: str) -> str:
+    config = json.dumps([model, llm_adapter(schema).json_schema(), temperature], sort_keys=True)
+    return hashlib.blake2b(f"{config}\x1f{prompt}".encode(), digest_size=16).hexdigest()
+
+def load_llm_response(key: str, schema: Any) -> Any:
+    try:
+        row = get_db().execute(
+            'SELECT response FROM llm_cache WHERE key = ? AND created_at >= ?',
+            (key, (datetime.now(UTC) - LLM_CACHE_TTL).timestamp()),
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return llm_adapter(schema).validate_json(row[0]) if row else None
+
+def save_llm_response(key: str, model: str, schema: Any, parsed: Any) -> None:
+    conn = get_db()
+    conn.execute(
+        'INSERT OR REPLACE INTO llm_cache (key, model, response, created_at) VALUES (?, ?, ?, ?)',
+        (key, model, llm_adapter(schema).dump_json(parsed).decode(), datetime.now(UTC).timestamp()),
+    )
+    conn.commit()
+
+def compact_llm_cache(conn: sqlite3.Connection) -> int:
+    """Drop expired responses, then the oldest ones past LLM_CACHE_MAX_BYTES."""
+    expired = conn.execute('DELETE FROM llm_cache WHERE created_at < ?', ((datetime.now(UTC) - LLM_CACHE_TTL).timestamp(),))
+    evicted = conn.execute('''
+        DELETE FROM llm_cache WHERE key IN (
+            SELECT key FROM (
+                SELECT key, SUM(LENGTH(response)) OVER (ORDER BY created_at DESC, key) AS total FROM llm_cache
+            ) WHERE total > ?
         )
+    ''', (LLM_CACHE_MAX_BYTES,))
+    return expired.rowcount + evicted.rowcount
+
+async def llm_generate(
+    backend: LLMBackend,
+    kind: str,
+    prompt: str,
+    schema: Any,
+    temperature: float,
+    semaphore: asyncio.Semaphore,
+    complete: Callable[[Any], bool] | None = None,
+) -> Any:
+    """One structured LLM call, answered from llm_cache when the same request was answered before.
+
+    Otherwise it waits for the semaphore and the shared rate limiter, and raises LLMUnavailable while
+    the circuit breaker is open. Only responses that match `schema` and that `complete` accepts are
+    cached, so a partial answer is asked for again rather than replayed from the cache.
+    """
+    key = llm_cache_key(backend.model, schema, temperature, prompt)
+    cached = load_llm_response(key, schema)
+    if cached is not None and complete and not complete(cached):
+        cached = None
+    _metrics.record_cache('llm', int(cached is not None), int(cached is None))
+    if cached is not None:
+        return cached
+
+    async with semaphore:
+        _llm_breaker.allow()
+        await asyncio.sleep(_llm_limiter.delay())
+        started = time.perf_counter()
+        try:
+            reply = await backend.generate(prompt, schema, temperature)
+        except Exception:
+            _llm_breaker.record(False)
+            raise
+        _llm_breaker.record(True)
+        _metrics.record_llm(kind, time.perf_counter() - started, reply)
+    try:
+        parsed = llm_adapter(schema).validate_python(reply.parsed)
+    except ValidationError:
+        return reply.parsed
+    if complete is None or complete(parsed):
+        save_llm_response(key, backend.model, schema, parsed)
+    return parsed
+
+async def generate_statement_chunk(
+    backend: LLMBackend,
+    chunk: list[tuple[int, MarketInput]],
+    semaphore: asyncio.Semaphore,
+) -> dict[int, MarketStatement]:
+    """Generate statements for one chunk, keyed by the market's index in the request."""
+    prompt = STATEMENT_PROMPT + ''.join(format_statement_item(i, m) for i, m in chunk)
+    wanted = {i for i, _ in chunk}
+    for attempt in range(LLM_RETRIES + 1):
+        try:
+            # Lower temperature for more consistent output
+            parsed = await llm_generate(
+                backend, 'statements', prompt, list[IndexedStatement], 0.3, semaphore,
+                complete=lambda statements: wanted <= {s.index for s in statements},
+            )
+            if not isinstance(parsed, list):
+                raise ValueError(f"Expected list but got {type(parsed)}")
+            statements = {
+                s.index: MarketStatement(statement=s.statement, category=s.category)
+                for s in parsed if s.index in wanted
+            }
+            # A partial reply is retried; the last attempt keeps what it got
+            if len(statements) < len(wanted) and attempt < LLM_RETRIES:
+                raise ValueError(f"{len(wanted) - len(statements)} of {len(wanted)} statements missing")
+            return statements
+        except LLMUnavailable as e:
+            print(f"❌ Statement chunk of {len(chunk)} skipped: {e}")
+            return {}
+        except Exception as e:
+            _metrics.record_llm_error('statements')
+            if attempt == LLM_RETRIES:
+                print(f"❌ Statement chunk of {len(chunk)} failed after {attempt + 1} attempt(s): {e}")
+                return {}
+            await asyncio.sleep(BACKOFF_BASE * 2 ** attempt * random.uniform(0.5, 1.5))
+    return {}
+
+async def generate_statements_async(markets: list[Market]) -> list[MarketStatement]:
+    """Use LLM to convert questions to declarative statements, one per input market."""
+    if not markets:
+        return []
 
-        # Parse response with type checking
-        if not isinstance(response.parsed, list):
-            raise ValueError(f"Expected list but got {type(response.parsed)}")
+    backend = get_llm_backend()
+    # Markets are numbered from 1 across all chunks; the model echoes the number back
+    inputs = [(i, m) for i, m in enumerate((market_input(market) for market in markets), 1) if m]
+    chunks = chunk_statement_inputs(inputs) if inputs else []
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    results: dict[int, MarketStatement] = {}
+    for chunk_result in await asyncio.gather(*(generate_statement_chunk(backend, c, semaphore) for c in chunks)):
+        results.update(chunk_result)
+
+    missing = len(markets) - len(results)
+    if missing:
+        print(f"⚠️  Warning: {missing} of {len(markets)} statements missing, using question text")
+    if len(chunks) > 1:
+        print(f"  Generated statements in {len(chunks)} chunks")
+    return [results.get(i) or fallback_statement(market) for i, market in enumerate(markets, 1)]
+
+def generate_statements(markets: list[Market]) -> list[MarketStatement]:
+    return run_async(generate_statements_async(markets))
+
+def statement_content_hash(question: str, event_title: str | None) -> str:
+    return hashlib.blake2b(f"{question}\x1f{event_title or ''}".encode(), digest_size=8).hexdigest()
+
+def statement_cache_key(market: Market) -> tuple[str, str, str]:
+    return market.id, market.most_likely_outcome, statement_content_hash(market.question, market.event_title)
+
+def load_cached_statements(markets: list[Market]) -> dict[str, MarketStatement]:
+    """Bulk lookup of cached statements; refreshes last_used on hits."""
+    if not markets or not os.path.exists(DB_FILE):
+        return {}
+    keys = {statement_cache_key(m) for m in markets}
+    conn = get_db()
+    rows = conn.execute('''
+        SELECT market_id, outcome, content_hash, statement, category FROM statement_cache
+        WHERE market_id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps([m.id for m in markets]),)).fetchall()
+    hits = {row[:3]: MarketStatement(statement=row[3], category=row[4]) for row in rows if row[:3] in keys}
+    conn.executemany(
+        'UPDATE statement_cache SET last_used = ? WHERE market_id = ? AND outcome = ? AND content_hash = ?',
+        [(datetime.now(UTC).timestamp(), *key) for key in hits]
+    )
+    conn.commit()
+    return {key[0]: statement for key, statement in hits.items()}
 
-        statements: list[MarketStatement] = response.parsed
+def save_cached_statements(markets: list[Market], statements: list[MarketStatement]) -> None:
+    now = datetime.now(UTC)
+    conn = get_db()
+    # Question-text fallbacks are not cached so the next run retries them
+    conn.executemany(
+        'INSERT OR REPLACE INTO statement_cache (market_id, outcome, content_hash, statement, category, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+        [(*statement_cache_key(m), st.statement, st.category, now.timestamp())
+         for m, st in zip(markets, statements) if st.category != 'Uncategorized']
+    )
+    conn.execute('DELETE FROM statement_cache WHERE last_used < ?', ((now - STATEMENT_CACHE_TTL).timestamp(),))
+    conn.commit()
 
-        # Verify we got the right number of statements
-        if len(statements) != len(market_inputs):
-            print(f"⚠️  Warning: Expected {len(market_inputs)} statements but got {len(statements)}")
-            # Fall back to simple conversion for any missing
-            while len(statements) < len(market_inputs):
-                idx = len(statements)
-                m = market_inputs[idx]
-                statements.append(MarketStatement(
-                    statement=f"{m.question.rstrip('?')}.",
-                    category='Uncategorized'
-                ))
+def seed_statement_cache(conn: sqlite3.Connection) -> None:
+    """Populate an empty statement cache from the previously published markets.json."""
+    if conn.execute('SELECT 1 FROM statement_cache LIMIT 1').fetchone():
+        return
+    previous = [m for m in load_previous_markets().values()
+                if m.get('mostLikelyOutcome') and m.get('statement') and m.get('category', 'Uncategorized') != 'Uncategorized']
+    rows = []
+    for m in previous:
+        # Older files carry the raw `events` list instead of `eventTitle`
+        events = m.get('events')
+        event_title = m.get('eventTitle') or (events[0].get('title') if events and isinstance(events[0], dict) else None)
+        content_hash = statement_content_hash(m.get('question', ''), event_title)
+        rows.append((m['id'], m['mostLikelyOutcome'], content_hash, m['statement'], m['category'], datetime.now(UTC).timestamp()))
+    conn.executemany(
+        'INSERT OR IGNORE INTO statement_cache (market_id, outcome, content_hash, statement, category, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+        rows
+    )
+    conn.commit()
 
-        return statements
+def question_hash(market: Market) -> str:
+    return hashlib.blake2b(market.question.encode(), digest_size=8).hexdigest()
 
-    except Exception as e:
-        print(f"❌ Error generating statements with LLM: {e}")
-        print("   Falling back to simple conversion...")
-        # Fallback: simple conversion
-        return [MarketStatement(statement=f"{m.question.rstrip('?')}.", category='Uncategorized') for m in market_inputs]
+def load_redundancy_cache(markets: list[Market]) -> dict[str, str | None]:
+    """Valid cached decisions for `markets`.
 
-def load_redundancy_cache() -> dict[str, str | None]:
-    if not os.path.exists(DB_FILE):
+    An entry is valid while it is younger than REDUNDANCY_CACHE_TTL, its question is
+    unchanged, and the market that made it redundant is still in `markets`.
+    """
+    if not os.path.exists(DB_FILE) or not markets:
         return {}
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    by_id = {m.id: m for m in markets}
     try:
-        cursor.execute('SELECT market_id, redundant_of FROM redundancy_cache')
-        return {row[0]: row[1] for row in cursor.fetchall()}
+        rows = get_db().execute('''
+            SELECT market_id, redundant_of, question_hash FROM redundancy_cache
+            WHERE market_id IN (SELECT value FROM json_each(?)) AND created_at >= datetime('now', ?)
+        ''', (json.dumps(list(by_id)), f'-{REDUNDANCY_CACHE_TTL.total_seconds():.0f} seconds')).fetchall()
     except sqlite3.OperationalError:
         return {}
-    finally:
-        conn.close()
+    return {
+        mid: redundant_of for mid, redundant_of, q_hash in rows
+        if q_hash == question_hash(by_id[mid])
+        and (redundant_of is None or redundant_of == REDUNDANT_UNKNOWN or redundant_of in by_id)
+    }
 
-def save_redundancy_cache(decisions: dict[str, tuple[str | None, str]]) -> None:
+def save_redundancy_cache(decisions: dict[str, tuple[str | None, str]], markets: list[Market]) -> None:
     if not decisions:
         return
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.executemany(
-        'INSERT OR REPLACE INTO redundancy_cache (market_id, redundant_of, reason) VALUES (?, ?, ?)',
-        [(mid, red_of, reason) for mid, (red_of, reason) in decisions.items()]
+    hashes = {m.id: question_hash(m) for m in markets}
+    conn = get_db()
+    conn.executemany(
+        'INSERT OR REPLACE INTO redundancy_cache (market_id, redundant_of, reason, question_hash) VALUES (?, ?, ?, ?)',
+        [(mid, red_of, reason, hashes.get(mid)) for mid, (red_of, reason) in decisions.items()]
     )
     conn.commit()
-    conn.close()
 
-def check_redundancy_llm(
-    new_markets: list[dict[str, Any]],
-    existing_markets: list[dict[str, Any]] | None = None
-) -> dict[str, tuple[str | None, str]]:
-    if not new_markets:
-        return {}
-
-    api_key = os.getenv('GOOGLE_API_KEY')
-    if not api_key:
-        print("⚠️  GOOGLE_API_KEY not found, skipping redundancy check")
-        return {m.get('id'): (None, "no api key") for m in new_markets}
+def compact_redundancy_cache(conn: sqlite3.Connection) -> int:
+    """Drop expired decisions, decisions about markets that have ended and failed checks saved by older versions."""
+    cursor = conn.execute('''
+        DELETE FROM redundancy_cache WHERE created_at < datetime('now', ?)
+        OR market_id IN (SELECT market_id FROM market_meta WHERE end_date < ?)
+        OR reason LIKE 'error: %' OR reason = 'no llm backend'
+    ''', (f'-{REDUNDANCY_CACHE_TTL.total_seconds():.0f} seconds', datetime.now(UTC).strftime('%Y-%m-%d')))
+    return cursor.rowcount
 
-    prompt = """Identify REDUNDANT predictions that should be removed.
+REDUNDANCY_PROMPT = """Identify REDUNDANT predictions that should be removed.
 
 A prediction is REDUNDANT if another prediction logically implies it - if one is true, the other MUST also be true.
 
@@ -365,102 +1446,338 @@ NOT redundant (keep both):
 - Different specific times: "BTC price on June 30" vs "BTC price on Dec 31"
 - Unrelated: "Trump wins election" vs "Republicans win House"
 
-Return IDs of predictions to REMOVE. When in doubt, keep both.
+Return IDs of predictions to REMOVE, and for each one the ID of the prediction that implies it in `implied_by`. When in doubt, keep both.
 
 """
+
+MONTHS = {m: i for i, m in enumerate(['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)}
+NUMBER = r'\$?(\d[\d,]*(?:\.\d+)?)\s*([kmb]\b|%)?'
+LADDER_PATTERNS = [
+    (1, re.compile(r'\b(?:above|over|greater than|more than|at least|higher than|exceeds?|hits?|reach(?:es)?)\s+' + NUMBER, re.I)),
+    (-1, re.compile(r'\b(?:below|under|less than|lower than|(?:dips?|falls?|drops?) to)\s+' + NUMBER, re.I)),
+]
+DEADLINE_PATTERN = re.compile(
+    r'\bby\s+(?:the end of\s+)?(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?(?:\s+(\d{1,2})(?:st|nd|rd|th)?\b)?(?:,?\s+(\d{4}))?', re.I)
+STOPWORDS = {
+    'will', 'the', 'be', 'by', 'of', 'in', 'on', 'for', 'and', 'a', 'an', 'to', 'at', 'or', 'than', 'before',
+    'after', 'end', 'this', 'that', 'with', 'is', 'are', 'any', 'its', 'from', 'as', 'next',
+}
+
+def ladder_rungs(question: str, end_ts: float = np.nan) -> list[tuple[tuple[str, ...], float]]:
+    """Parse threshold and deadline ladders as (group key, strength). A stronger rung implies weaker ones.
+
+    A deadline without a year takes the one that puts it nearest the market's end (`end_ts`); with
+    neither, its rung is left out.
+    """
+    rungs = []
+    for direction, pattern in LADDER_PATTERNS:
+        match = pattern.search(question)
+        if match:
+            value = float(match.group(1).replace(',', ''))
+            value *= {'k': 1e3, 'm': 1e6, 'b': 1e9}.get((match.group(2) or '').lower(), 1)
+            end = match.end(2) if match.group(2) else match.end(1)
+            template = question[:match.start(1)] + '#' + question[end:]
+            rungs.append(((template.lower(), str(direction)), direction * value))
+            break
+    match = DEADLINE_PATTERN.search(question)
+    if match and (match.group(3) or not np.isnan(end_ts)):
+        month, day = MONTHS[match.group(1).lower()[:3]], int(match.group(2) or 31)
+        if match.group(3):
+            year = int(match.group(3))
+        else:
+            # "by December 31" on a market ending in January is last December, not this year's
+            end = datetime.fromtimestamp(end_ts, UTC)
+            year = min((end.year - 1, end.year, end.year + 1),
+                       key=lambda y: abs(((y - end.year) * 12 + month - end.month) * 32 + day - end.day))
+        template = question[:match.start()] + 'by @' + question[match.end():]
+        # Earlier deadlines imply later ones
+        rungs.append(((template.lower(), 'by'), -((year * 12 + month) * 32 + day)))
+    return rungs
+
+def resolve_ladders(markets: list[Market]) -> dict[str, tuple[str | None, str]]:
+    """Deterministically mark weaker rungs of threshold/deadline ladders as redundant."""
+    groups: dict[tuple[str, ...], list[tuple[float, Market]]] = {}
+    for m in markets:
+        for key, strength in ladder_rungs(m.question, m.end_ts):
+            groups.setdefault(key, []).append((strength, m))
+
+    decisions: dict[str, tuple[str | None, str]] = {}
+    for rungs in groups.values():
+        if len(rungs) < 2:
+            continue
+        rungs.sort(key=lambda r: r[0], reverse=True)
+        strongest, best = rungs[0]
+        if rungs[1][0] == strongest:
+            continue  # Tied rungs are left to the LLM
+        for _, m in rungs[1:]:
+            decisions.setdefault(m.id, (best.id, f"implied by \"{best.question}\""))
+    return decisions
+
+def question_tokens(question: str) -> set[str]:
+    return {t for t in re.findall(r'[a-z][a-z0-9]+', question.lower()) if t not in STOPWORDS}
+
+def candidate_clusters(
+    new_markets: list[Market],
+    existing_markets: list[Market],
+) -> list[list[Market]]:
+    """Group new markets with similar markets via a token-overlap index. Singletons are dropped."""
+    markets = new_markets + existing_markets
+    tokens = [question_tokens(m.question) for m in markets]
+    postings: dict[str, list[int]] = {}
+    for i, toks in enumerate(tokens):
+        for t in toks:
+            postings.setdefault(t, []).append(i)
+
+    parent = list(range(len(markets)))
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(new_markets)):
+        overlaps: dict[int, int] = {}
+        for t in tokens[i]:
+            if len(postings[t]) > REDUNDANCY_MAX_POSTING:
+                continue  # Too common to discriminate
+            for j in postings[t]:
+                if j != i:
+                    overlaps[j] = overlaps.get(j, 0) + 1
+        for j, shared in overlaps.items():
+            if shared / len(tokens[i] | tokens[j]) >= REDUNDANCY_SIMILARITY:
+                parent[find(i)] = find(j)
+
+    clusters: dict[int, list[Market]] = {}
+    for i, m in enumerate(markets):
+        clusters.setdefault(find(i), []).append(m)
+    return [
+        c[k:k + REDUNDANCY_CLUSTER_MAX]
+        for c in clusters.values() if len(c) > 1
+        for k in range(0, len(c), REDUNDANCY_CLUSTER_MAX)
+    ]
+
+async def check_redundancy_llm(
+    backend: LLMBackend,
+    new_markets: list[Market],
+    existing_markets: list[Market] | None = None,
+    semaphore: asyncio.Semaphore | None = None,
+) -> dict[str, tuple[str | None, str]]:
+    if not new_markets:
+        return {}
+
+    prompt = REDUNDANCY_PROMPT
     if existing_markets:
         prompt += "EXISTING PREDICTIONS (for reference):\n"
         for m in existing_markets:
-            prompt += f"- [{m.get('id')}] {m.get('question')} ({m.get('currentProbability', 0):.1f}%)\n"
+            prompt += f"- [{m.id}] {m.question} ({m.probability or 0:.1f}%)\n"
         prompt += "\nNEW PREDICTIONS TO CHECK:\n"
     else:
         prompt += "PREDICTIONS TO CHECK:\n"
 
     for m in new_markets:
-        prompt += f"- [{m.get('id')}] {m.get('question')} ({m.get('currentProbability', 0):.1f}%)\n"
+        prompt += f"- [{m.id}] {m.question} ({m.probability or 0:.1f}%)\n"
 
     try:
-        client = genai.Client(api_key=api_key)
-        response = client.models.generate_content(
-            model=MODEL,
-            contents=prompt,
-            config={"response_mime_type": "application/json", "response_schema": RedundancyResult, "temperature": 0.1},
-        )
-        result = response.parsed
+        result = await llm_generate(backend, 'redundancy', prompt, RedundancyResult, 0.1, semaphore or asyncio.Semaphore(1))
         if not isinstance(result, RedundancyResult):
             raise ValueError(f"Expected RedundancyResult but got {type(result)}")
 
-        redundant_ids = set(result.redundant_market_ids)
+        reasons = dict(zip(result.redundant_market_ids, result.reasoning))
+        known_ids = {m.id for m in new_markets + (existing_markets or [])}
+        implied_by = {mid: by for mid, by in zip(result.redundant_market_ids, result.implied_by) if by in known_ids and by != mid}
         decisions: dict[str, tuple[str | None, str]] = {}
-        for i, m in enumerate(new_markets):
-            mid = m.get('id')
-            if mid in redundant_ids:
-                reason = result.reasoning[i] if i < len(result.reasoning) else "redundant"
-                decisions[mid] = ("redundant", reason)
+        for m in new_markets:
+            mid = m.id
+            if mid in result.redundant_market_ids:
+                decisions[mid] = (implied_by.get(mid, REDUNDANT_UNKNOWN), reasons.get(mid, "redundant"))
             else:
                 decisions[mid] = (None, "not redundant")
         return decisions
+    # Failures decide nothing: the markets are kept for this run and checked again on the next one
+    except LLMUnavailable as e:
+        print(f"❌ Redundancy check skipped: {e}")
+        return {}
     except Exception as e:
+        _metrics.record_llm_error('redundancy')
         print(f"❌ Error in redundancy LLM call: {e}")
-        return {m.get('id'): (None, f"error: {e}") for m in new_markets}
-
-def deduplicate_semantic_redundancy(markets: list[dict[str, Any]]) -> list[dict[str, Any]]:
-    if len(markets) < 2:
-        return markets
-
-    cache = load_redundancy_cache()
-    cached_markets, new_markets = [], []
-
-    for m in markets:
-        mid = m.get('id')
-        if mid in cache:
-            if cache[mid] is None:
-                cached_markets.append(m)
-        else:
-            new_markets.append(m)
-
-    if not new_markets:
-        print(f"  ✓ Redundancy check: using cached decisions ({len(cached_markets)} kept)")
-        return cached_markets
-
-    print(f"  Checking {len(new_markets)} new markets for redundancy...")
+        return {}
 
-    decisions = check_redundancy_llm(new_markets, cached_markets) if cached_markets else check_redundancy_llm(new_markets)
-    save_redundancy_cache(decisions)
+async def check_redundancy_clusters(
+    clusters: list[list[Market]],
+    new_ids: set[str],
+) -> dict[str, tuple[str | None, str]]:
+    try:
+        backend = get_llm_backend()
+    except ValueError as e:
+        print(f"⚠️  {e}, skipping redundancy check")
+        return {}
 
-    kept_new = [m for m in new_markets if decisions.get(m.get('id'), (None,))[0] is None]
-    removed_count = len(new_markets) - len(kept_new)
-    if removed_count > 0:
-        print(f"  ✓ Removed {removed_count} redundant predictions")
-    return cached_markets + kept_new
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    results = await asyncio.gather(*(
+        check_redundancy_llm(
+            backend,
+            [m for m in c if m.id in new_ids],
+            [m for m in c if m.id not in new_ids],
+            semaphore,
+        )
+        for c in clusters
+    ))
+    return {mid: d for r in results for mid, d in r.items()}
+
+class RedundancyPlan:
+    """Semantic dedup split at the LLM: what cached decisions and local ladders settle, and what is left.
+
+    `settled` markets are kept whatever the LLM decides about the `pending` ones, so later stages can
+    start on them before `resolve` returns.
+    """
+
+    def __init__(self, markets: list[Market], cache: dict[str, str | None]) -> None:
+        self.markets = markets
+        self.decisions: dict[str, tuple[str | None, str]] = {}
+        self.clusters: list[list[Market]] = []
+        self.settled, self.pending = markets, []
+        self.new_count = 0
+        if len(markets) < 2:
+            return
+
+        _metrics.record_cache('redundancy', len(cache), len(markets) - len(cache))
+        cached_markets, new_markets = [], []
+        for m in markets:
+            mid = m.id
+            if mid in cache:
+                if cache[mid] is None:
+                    cached_markets.append(m)
+            else:
+                new_markets.append(m)
+
+        # Threshold and deadline ladders are resolved locally, including against cached markets
+        self.decisions = resolve_ladders(cached_markets + new_markets)
+        if self.decisions:
+            print(f"  ✓ Resolved {len(self.decisions)} ladder redundancies locally")
+            cached_markets = [m for m in cached_markets if m.id not in self.decisions]
+            new_markets = [m for m in new_markets if m.id not in self.decisions]
+
+        self.new_count = len(new_markets)
+        self.clusters = candidate_clusters(new_markets, cached_markets) if new_markets else []
+        clustered = {m.id for c in self.clusters for m in c}
+        unclustered = [m for m in new_markets if m.id not in clustered]
+        self.decisions.update({m.id: (None, "no similar markets") for m in unclustered})
+        self.settled = cached_markets + unclustered
+        self.pending = [m for m in new_markets if m.id in clustered]
+
+    def resolve(self) -> list[Market]:
+        """Check the pending markets with the LLM, save every decision and return all kept markets.
+
+        Pending markets the LLM could not decide on are kept without a decision, so the next run asks again.
+        """
+        if len(self.markets) < 2:
+            return self.markets
+        if not self.new_count:
+            save_redundancy_cache(self.decisions, self.markets)
+            print(f"  ✓ Redundancy check: using cached decisions ({len(self.settled)} kept)")
+            return self.settled
+
+        if self.clusters:
+            print(f"  Checking {len(self.pending)} new markets for redundancy in {len(self.clusters)} candidate clusters...")
+            self.decisions.update(run_async(check_redundancy_clusters(self.clusters, {m.id for m in self.pending})))
+        save_redundancy_cache(self.decisions, self.markets)
+
+        kept_pending = [m for m in self.pending if self.decisions.get(m.id, (None,))[0] is None]
+        removed_count = len(self.pending) - len(kept_pending)
+        if removed_count > 0:
+            print(f"  ✓ Removed {removed_count} redundant predictions")
+        return self.settled + kept_pending
+
+def update_features(frame: MarketFrame, now: datetime) -> dict[str, dict[str, float | None]]:
+    """Advance each market's running signals by one observation.
+
+    Momentum is an EWMA of the Yes-price rate of change (points/hour) per half-life,
+    volatility the EWMA of squared changes per hour, and volume acceleration the ratio
+    of fast to slow EWMA volume rates. Each update is O(1) in the market's history.
+    """
+    rows = np.flatnonzero(np.isfinite(frame.prices[:, 0]) & np.fromiter((bool(i) for i in frame.ids), dtype=bool, count=len(frame.ids)))
+    if not len(rows):
+        return {}
+    ids = [frame.ids[i] for i in rows]
+    price, volume = frame.prices[rows, 0] * 100, frame.volume[rows]
+    now_ts = now.timestamp()
+
+    conn = get_db()
+    state = {row[0]: row[1:] for row in conn.execute('''
+        SELECT market_id, updated_at, last_price, last_volume, momentum_1h, momentum_6h, momentum_24h,
+               variance, volume_rate_fast, volume_rate_slow FROM market_features
+        WHERE market_id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(ids),))}
+    prev = np.array([state.get(mid, (np.nan,) * 9) for mid in ids], dtype=float).reshape(len(ids), 9)
+    prev_ts, prev_price, prev_volume = prev[:, 0], prev[:, 1], prev[:, 2]
+    momentum = {label: prev[:, 3 + k] for k, label in enumerate(MOMENTUM_HALF_LIVES)}
+    variance, rate_fast, rate_slow = prev[:, 6], prev[:, 7], prev[:, 8]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dt = (now_ts - prev_ts) / 3600
+        step = dt > 0
+        dp = price - prev_price
+        price_rate = np.where(step, dp / dt, 0.0)
+        volume_rate = np.where(step, np.maximum(volume - prev_volume, 0) / dt, 0.0)
+
+        def ewma(current: np.ndarray, sample: np.ndarray, half_life: float) -> np.ndarray:
+            alpha = np.where(step, 1 - 0.5 ** (dt / half_life), 0.0)
+            return np.where(np.isnan(current), 0.0, current + alpha * (sample - current))
+
+        momentum = {label: ewma(momentum[label], price_rate, hl) for label, hl in MOMENTUM_HALF_LIVES.items()}
+        variance = ewma(variance, np.where(step, dp ** 2 / dt, 0.0), VOLATILITY_HALF_LIFE)
+        rate_fast = ewma(rate_fast, volume_rate, VOLUME_FAST_HALF_LIFE)
+        rate_slow = ewma(rate_slow, volume_rate, VOLUME_SLOW_HALF_LIFE)
+        acceleration = np.where(rate_slow > 0, rate_fast / rate_slow - 1, np.nan)
+
+    conn.executemany('''
+        INSERT OR REPLACE INTO market_features (market_id, updated_at, last_price, last_volume, momentum_1h,
+            momentum_6h, momentum_24h, variance, volume_rate_fast, volume_rate_slow)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', zip(ids, [now_ts] * len(ids), price.tolist(), volume.tolist(), *(m.tolist() for m in momentum.values()),
+               variance.tolist(), rate_fast.tolist(), rate_slow.tolist()))
+    conn.commit()
 
-def calculate_price_changes(market: dict[str, Any], historical_snapshots: dict[str, str | dict[str, Any] | None]) -> dict[str, float | None]:
-    changes: dict[str, float | None] = {'hour1': None, 'hours24': None, 'days7': None}
-    try:
-        prices = market.get('outcomePrices')
-        if isinstance(prices, str):
-            prices = json.loads(prices)
-        current_price = float(prices[0]) * 100
-    except (ValueError, TypeError, IndexError, json.JSONDecodeError, AttributeError):
-        return changes
-
-    market_id = market.get('id')
-    if not market_id:
-        return changes
-
-    for period, snapshot_data in historical_snapshots.items():
-        if not snapshot_data or not isinstance(snapshot_data, dict) or not snapshot_data.get('markets'):
-            continue
-        historical_market = snapshot_data['markets'].get(market_id)
-        if historical_market and historical_market.get('outcomePrices'):
-            try:
-                hist_prices = historical_market['outcomePrices']
-                if isinstance(hist_prices, str):
-                    hist_prices = json.loads(hist_prices)
-                changes[period] = round(current_price - float(hist_prices[0]) * 100, 2)
-            except (ValueError, TypeError, IndexError, json.JSONDecodeError):
-                continue
-    return changes
+    volatility = np.sqrt(variance)
+    return {
+        mid: {
+            **{f'momentum{label}': round(float(m[j]), 3) for label, m in momentum.items()},
+            'volatility': round(float(volatility[j]), 3),
+            'volumeAcceleration': None if np.isnan(acceleration[j]) else round(float(acceleration[j]), 3),
+        }
+        for j, mid in enumerate(ids)
+    }
+
+def calculate_price_changes(
+    frame: MarketFrame,
+    market_ids: list[str],
+    past: np.ndarray,
+) -> dict[str, dict[str, float | None]]:
+    """Change of the first outcome's price in percentage points over each PRICE_CHANGE_HORIZONS period.
+
+    `past` holds historical_prices rows for `market_ids`, the horizons' columns first.
+    """
+    rows = np.array([frame.row_of[mid] for mid in market_ids], dtype=int)
+    current = frame.prices[rows, 0] * 100 if len(rows) else np.zeros(0)
+    deltas = np.round(current[:, None] - past[:, :len(PRICE_CHANGE_HORIZONS)] * 100, 2)
+    return {
+        mid: {period: (None if np.isnan(d) else float(d)) for period, d in zip(PRICE_CHANGE_HORIZONS, deltas[j])}
+        for j, mid in enumerate(market_ids)
+    }
+
+def calculate_sparklines(
+    frame: MarketFrame,
+    market_ids: list[str],
+    past: np.ndarray,
+) -> dict[str, list[float | None]]:
+    """The first outcome's price in percent at each sparkline grid time, then now; None before its first tick."""
+    rows = np.array([frame.row_of[mid] for mid in market_ids], dtype=int)
+    current = frame.prices[rows, 0] if len(rows) else np.zeros(0)
+    series = np.round(np.column_stack([past[:, len(PRICE_CHANGE_HORIZONS):], current]) * 100, 1)
+    return {
+        mid: [None if np.isnan(v) else float(v) for v in series[j]]
+        for j, mid in enumerate(market_ids)
+    }
 
 def load_previous_markets() -> dict[str, dict[str, Any]]:
     if not os.path.exists(OUTPUT_FILE):
@@ -472,127 +1789,236 @@ def load_previous_markets() -> dict[str, dict[str, Any]]:
     except Exception:
         return {}
 
-def deduplicate_related_markets(markets: list[dict[str, Any]]) -> list[dict[str, Any]]:
+def deduplicate_related_markets(markets: list[Market]) -> list[Market]:
     """Deduplicate markets with same negRiskMarketID, keeping the most likely outcome."""
     from collections import defaultdict
 
-    groups: defaultdict[str, list[dict[str, Any]]] = defaultdict(list)
-    standalone_markets: list[dict[str, Any]] = []
+    groups: defaultdict[str, list[Market]] = defaultdict(list)
+    standalone_markets: list[Market] = []
 
     for market in markets:
-        neg_risk_id = market.get('negRiskMarketID')
+        neg_risk_id = market.neg_risk_id
         if neg_risk_id:
             groups[neg_risk_id].append(market)
         else:
             standalone_markets.append(market)
 
-    deduplicated: list[dict[str, Any]] = []
+    deduplicated: list[Market] = []
     for group_markets in groups.values():
         if len(group_markets) == 1:
             deduplicated.append(group_markets[0])
         else:
-            yes_markets = [m for m in group_markets if m.get('mostLikelyOutcome') == 'Yes']
+            yes_markets = [m for m in group_markets if m.most_likely_outcome == 'Yes']
             if yes_markets:
-                best = max(yes_markets, key=lambda m: m.get('currentProbability', 0))
-                print(f"  ✓ Grouped event: Keeping \"{best.get('question', '')[:60]}...\" ({round(best.get('currentProbability', 0), 1)}%)")
+                best = max(yes_markets, key=lambda m: m.probability or 0)
+                print(f"  ✓ Grouped event: Keeping \"{best.question[:60]}...\" ({round(best.probability or 0, 1)}%)")
             else:
-                best = max(group_markets, key=lambda m: float(m.get('volume', 0)))
-                print(f"  ⚠️  Uncertain event: Keeping highest volume - \"{best.get('question', '')[:60]}...\"")
+                best = max(group_markets, key=lambda m: m.volume)
+                print(f"  ⚠️  Uncertain event: Keeping highest volume - \"{best.question[:60]}...\"")
             deduplicated.append(best)
 
     deduplicated.extend(standalone_markets)
     return deduplicated
 
-def filter_and_sort_markets(markets: list[dict[str, Any]], historical_snapshots: dict[str, str | dict[str, Any] | None]) -> list[dict[str, Any]]:
-    now = datetime.now(UTC)
-    filtered = []
-    previous_markets = load_previous_markets()
-
-    # Track filtering reasons
-    skip_reasons = {'no_end_date': 0, 'inactive': 0, 'closed': 0, 'date_range': 0, 'outcome_no': 0, 'prob_low': 0, 'parse_err': 0}
-
-    for market in markets:
-        if not market.get('endDateIso'):
-            skip_reasons['no_end_date'] += 1
-            continue
-        if not market.get('active'):
-            skip_reasons['inactive'] += 1
-            continue
-        if market.get('closed'):
-            skip_reasons['closed'] += 1
-            continue
-        try:
-            end_date_str = market['endDateIso']
-            end_date = datetime.fromisoformat(
-                end_date_str.replace('Z', '+00:00') if 'T' in end_date_str else end_date_str + 'T00:00:00+00:00'
-            )
-            days_until_end = (end_date - now).days
-            if not (0 < days_until_end <= 90):
-                skip_reasons['date_range'] += 1
-                continue
-
-            most_likely_outcome, current_probability = get_most_likely_outcome(market)
-            if most_likely_outcome is None or current_probability is None:
-                skip_reasons['parse_err'] += 1
-                continue
-            if most_likely_outcome == 'No':
-                skip_reasons['outcome_no'] += 1
-                continue
-            if current_probability < 55:
-                skip_reasons['prob_low'] += 1
-                continue
-
-            market['mostLikelyOutcome'] = most_likely_outcome
-            market['currentProbability'] = current_probability
-            events = market.get('events')
-            market['eventSlug'] = events[0].get('slug') if events and isinstance(events, list) and events else None
-            filtered.append(market)
-        except (ValueError, TypeError):
-            skip_reasons['parse_err'] += 1
-            continue
-
-    log.info(f"Filter: {len(markets)} raw → {len(filtered)} after basic (skipped: {skip_reasons})")
-
-    before = len(filtered)
-    filtered = deduplicate_related_markets(filtered)
-    log.info(f"Filter: {before} → {len(filtered)} after related dedup (-{before - len(filtered)})")
-
-    before = len(filtered)
-    filtered = deduplicate_semantic_redundancy(filtered)
-    log.info(f"Filter: {before} → {len(filtered)} after semantic dedup (-{before - len(filtered)})")
-
+class MarketStream:
+    """Survivors of the basic filters, collected page by page while the fetch is still running.
+
+    Each page is parsed into its own MarketFrame, advances the running features, is handed to the
+    snapshot writer and is then dropped, so only survivors outlive their page.
+    """
+
+    def __init__(self, now: datetime, snapshot: 'SnapshotWriter | None' = None) -> None:
+        self.now = now
+        self.snapshot = snapshot
+        self.fetched = 0
+        self.skip_reasons: dict[str, int] = {}
+        self.survivors: list[tuple[int, Market]] = []
+
+    def add(self, offset: int, page: list[Market]) -> None:
+        self.fetched += len(page)
+        if self.snapshot:
+            self.snapshot.add(page, frozenset(m.id for m in page if m.id in _record_cache.unchanged))
+        with _metrics.stage('filter'):
+            frame = MarketFrame(page)
+            features = update_features(frame, self.now)
+            kept_rows, skip_reasons = frame.basic_filter(self.now)
+            for reason, count in skip_reasons.items():
+                self.skip_reasons[reason] = self.skip_reasons.get(reason, 0) + count
+            for i in kept_rows:
+                market = frame.annotate(i)
+                market.features = features.get(market.id)
+                self.survivors.append((offset, market))
+
+    def markets(self) -> list[Market]:
+        """Survivors in API order, whatever order their pages arrived in."""
+        return [m for _, m in sorted(self.survivors, key=lambda s: s[0])]
+
+class StageGraph:
+    """A run's stages as a small DAG: each stage starts on its own thread as soon as its inputs are done.
+
+    A stage is called with its inputs' results, in the order it declared them. Inputs must be added
+    before the stages that use them, so the graph cannot have cycles.
+    """
+
+    def __init__(self) -> None:
+        self.stages: dict[str, tuple[Callable[..., Any], tuple[str, ...]]] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], *inputs: str) -> None:
+        unknown = [i for i in inputs if i not in self.stages]
+        if unknown:
+            raise ValueError(f"Stage {name!r} depends on unknown stages {unknown}")
+        self.stages[name] = (fn, inputs)
+
+    def run(self) -> dict[str, Any]:
+        """Run every stage; returns their results by name. A failing stage's error is re-raised."""
+        results: dict[str, Any] = {}
+        pending = dict(self.stages)
+        with ThreadPoolExecutor(max_workers=max(1, len(self.stages)), thread_name_prefix='stage') as pool:
+            running: dict[Future, str] = {}
+            while pending or running:
+                for name, (fn, inputs) in list(pending.items()):
+                    if all(i in results for i in inputs):
+                        running[pool.submit(fn, *(results[i] for i in inputs))] = name
+                        del pending[name]
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        return results
+
+def filter_and_sort_markets(stream: MarketStream) -> list[Market]:
+    """Dedup, price changes and statements as a StageGraph, then rank.
+
+    Price changes only need the related-market dedup. Statements for markets the redundancy check
+    settles locally (cached, or similar to nothing) start while the LLM checks the rest, so only
+    markets it actually had to check wait for it.
+    """
+    filtered = stream.markets()
+    log.info(f"Filter: {stream.fetched} raw → {len(filtered)} after basic (skipped: {stream.skip_reasons})")
+
+    def related() -> list[Market]:
+        with _metrics.stage('dedup'):
+            deduplicated = deduplicate_related_markets(filtered)
+        log.info(f"Filter: {len(filtered)} → {len(deduplicated)} after related dedup (-{len(filtered) - len(deduplicated)})")
+        return deduplicated
+
+    def plan_redundancy(markets: list[Market]) -> RedundancyPlan:
+        with _metrics.stage('dedup'):
+            return RedundancyPlan(markets, load_redundancy_cache(markets) if len(markets) >= 2 else {})
+
+    def semantic(plan: RedundancyPlan) -> list[Market]:
+        with _metrics.stage('dedup'):
+            kept = plan.resolve()
+        log.info(f"Filter: {len(plan.markets)} → {len(kept)} after semantic dedup (-{len(plan.markets) - len(kept)})")
+        return kept
+
+    def history(markets: list[Market]) -> None:
+        with _metrics.stage('history'):
+            ids = [m.id for m in markets]
+            frame, past = MarketFrame(markets), load_historical_prices(ids)
+            price_changes = calculate_price_changes(frame, ids, past)
+            sparklines = calculate_sparklines(frame, ids, past)
+            for market in markets:
+                market.price_changes, market.sparkline = price_changes[market.id], sparklines[market.id]
+
+    def settled_statements(plan: RedundancyPlan) -> None:
+        with _metrics.stage('statements'):
+            fill_statements(plan.settled)
+
+    def pending_statements(plan: RedundancyPlan, kept: list[Market]) -> None:
+        pending = {m.id for m in plan.pending}
+        with _metrics.stage('statements'):
+            fill_statements([m for m in kept if m.id in pending])
+
+    graph = StageGraph()
+    graph.add('related', related)
+    graph.add('plan_redundancy', plan_redundancy, 'related')
+    graph.add('semantic', semantic, 'plan_redundancy')
+    graph.add('history', history, 'related')
+    graph.add('settled_statements', settled_statements, 'plan_redundancy')
+    graph.add('pending_statements', pending_statements, 'plan_redundancy', 'semantic')
+    return rank_markets(graph.run()['semantic'], RANKING_WEIGHTS, MAX_PUBLISHED, MAX_PER_CATEGORY)
+
+def column(markets: list[Market], values: Iterable[float]) -> np.ndarray:
+    return np.fromiter(values, dtype=float, count=len(markets))
+
+def momentum(markets: list[Market]) -> np.ndarray:
+    """Recent movement in percentage points, the last hour weighted 3× the last day (see TRENDING_LOGIC.md)."""
+    changes = [m.price_changes or {} for m in markets]
+    hour = column(markets, (c.get('hour1') or 0.0 for c in changes))
+    day = column(markets, (c.get('hours24') or 0.0 for c in changes))
+    return np.abs(hour) * 3 + np.abs(day)
+
+def entropy(markets: list[Market]) -> np.ndarray:
+    """Binary entropy of the most likely outcome's probability: 1 bit at 50%, 0 at certainty."""
+    p = column(markets, (m.probability or 0.0 for m in markets)) / 100
+    q = np.clip(p, 1e-12, 1 - 1e-12)
+    return np.where((p > 0) & (p < 1), -q * np.log2(q) - (1 - q) * np.log2(1 - q), 0.0)
+
+# Ranking keys by name, each computed for all markets at once. Volume and liquidity are log10 dollars so
+# they mix with the others on a similar scale
+RANKING_KEYS: dict[str, Callable[[list[Market]], np.ndarray]] = {
+    'volume': lambda ms: np.log10(1 + column(ms, (m.volume for m in ms))),
+    'liquidity': lambda ms: np.log10(1 + column(ms, (m.liquidity or 0.0 for m in ms))),
+    'momentum': momentum,
+    'entropy': entropy,
+}
+
+def rank_markets(
+    markets: list[Market],
+    weights: dict[str, float],
+    limit: int | None = None,
+    per_category: int | None = None,
+) -> list[Market]:
+    """Publication order: highest weighted score first, at most `per_category` per category and `limit` overall.
+
+    Each key is computed once per market. With a cap, heap selection picks the top markets without
+    sorting the rest. Ties keep the input order.
+    """
+    unknown = set(weights) - set(RANKING_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown ranking keys {sorted(unknown)}, expected some of {sorted(RANKING_KEYS)}")
+    total = np.zeros(len(markets))
+    for name, weight in weights.items():
+        if weight:
+            total += weight * RANKING_KEYS[name](markets)
+    score = total.tolist().__getitem__
+
+    rows: Iterable[int] = range(len(markets))
+    if per_category is not None:
+        by_category: dict[str | None, list[int]] = {}
+        for i, m in enumerate(markets):
+            by_category.setdefault(m.category, []).append(i)
+        # Merged back into input order so ties across categories still keep it
+        rows = sorted(i for group in by_category.values() for i in heapq.nlargest(per_category, group, key=score))
+    ranked = sorted(rows, key=score, reverse=True) if limit is None else heapq.nlargest(limit, rows, key=score)
+    return [markets[i] for i in ranked]
+
+def fill_statements(filtered: list[Market]) -> None:
+    """Attach statement and category, from the cache or the LLM."""
+    if not filtered:
+        return
+    cached_statements = load_cached_statements(filtered)
+    markets_needing_statements = []
     for market in filtered:
-        market['priceChanges'] = calculate_price_changes(market, historical_snapshots)
-
-    markets_needing_statements, market_indices = [], []
-    for i, market in enumerate(filtered):
-        previous_data = previous_markets.get(market.get('id', ''))
-        if previous_data and previous_data.get('mostLikelyOutcome') == market['mostLikelyOutcome']:
-            market['statement'] = previous_data.get('statement', market.get('question'))
-            market['displayProbability'] = round(market['currentProbability'])
-            market['category'] = previous_data.get('category', 'Uncategorized')
+        cached = cached_statements.get(market.id)
+        if cached:
+            market.statement, market.category = cached.statement, cached.category
         else:
             markets_needing_statements.append(market)
-            market_indices.append(i)
+    print(f"  Statement cache: {len(cached_statements)} hits, {len(markets_needing_statements)} misses")
+    _metrics.record_cache('statements', len(cached_statements), len(markets_needing_statements))
 
     if markets_needing_statements:
         print(f"Generating {len(markets_needing_statements)} statements via LLM...")
         try:
             statements = generate_statements(markets_needing_statements)
-            for i, statement_obj in enumerate(statements):
-                market = filtered[market_indices[i]]
-                market['statement'] = statement_obj.statement
-                market['displayProbability'] = round(market['currentProbability'])
-                market['category'] = statement_obj.category
+            save_cached_statements(markets_needing_statements, statements)
+            for market, statement_obj in zip(markets_needing_statements, statements):
+                market.statement, market.category = statement_obj.statement, statement_obj.category
         except Exception as e:
             print(f"LLM generation failed: {e}, using fallback")
-            for i, market in enumerate(markets_needing_statements):
-                filtered[market_indices[i]]['statement'] = market.get('question', '').rstrip('?') + '.'
-                filtered[market_indices[i]]['displayProbability'] = round(market['currentProbability'])
-                filtered[market_indices[i]]['category'] = 'Uncategorized'
-
-    filtered.sort(key=lambda x: float(x.get('volume', 0)), reverse=True)
-    return filtered
+            for market in markets_needing_statements:
+                market.statement, market.category = market.question.rstrip('?') + '.', 'Uncategorized'
 
 class DecimalEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -600,77 +2026,548 @@ class DecimalEncoder(json.JSONEncoder):
             return float(obj)
         return super().default(obj)
 
-def upload_to_r2(data: dict[str, Any]) -> bool:
-    """Upload markets.json to Cloudflare R2 bucket."""
+def compact_json(obj: Any) -> bytes:
+    return json.dumps(obj, cls=DecimalEncoder, separators=(',', ':')).encode()
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+def local_path(key: str) -> str:
+    return os.path.join(os.path.dirname(OUTPUT_FILE), key)
+
+def category_key(category: str) -> str:
+    return f"{CATEGORY_PREFIX}{re.sub(r'[^a-z0-9]+', '-', category.lower()).strip('-') or 'uncategorized'}.json"
+
+def with_markets(header: dict[str, Any], records: list[bytes], field: str = 'markets') -> bytes:
+    """Append already-encoded records to a header object without re-serializing them."""
+    return compact_json(header)[:-1] + f',"{field}":['.encode() + b','.join(records) + b']}'
+
+def load_published_records() -> dict[str, str]:
+    return dict(get_db().execute('SELECT market_id, record_hash FROM published_records'))
+
+def save_published_records(record_hashes: dict[str, str]) -> None:
+    conn = get_db()
+    conn.execute('DELETE FROM published_records')
+    conn.executemany('INSERT INTO published_records (market_id, record_hash) VALUES (?, ?)', record_hashes.items())
+    conn.commit()
+
+def load_manifest() -> dict[str, Any]:
+    try:
+        with open(local_path(SIDECAR_KEY), 'rb') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def build_publication(
+    markets: list[Market], last_updated: str
+) -> tuple[dict[str, tuple[bytes, str]], bytes, dict[str, str]]:
+    """Encode every published object once. Returns ({key: (body, version)}, manifest, record hashes).
+
+    Each record is serialized once and its bytes are reused by markets.json, the delta and the category
+    shards. Versions hash content only, so an object's version changes only when what it publishes does.
+    """
+    ids = [m.id for m in markets]
+    records = [compact_json(m.published()) for m in markets]
+    record_hashes = {market_id: content_hash(r) for market_id, r in zip(ids, records) if market_id}
+    version = content_hash(b'[' + b','.join(records) + b']')
+    objects = {MARKETS_KEY: (
+        with_markets({
+            'schemaVersion': PUBLISHED_SCHEMA_VERSION, 'lastUpdated': last_updated, 'version': version,
+            'marketCount': len(markets),
+        }, records), version,
+    )}
+
+    previous = load_manifest()
+    if previous.get('version') == version:
+        delta = previous.get('delta')
+    else:
+        # Changed-records list against the previous version; order lists the ids of the new version
+        published = load_published_records()
+        changed = [r for market_id, r in zip(ids, records) if published.get(market_id) != record_hashes.get(market_id)]
+        header = {
+            'schemaVersion': PUBLISHED_SCHEMA_VERSION,
+            'version': version,
+            'baseVersion': previous.get('version') if published else None,
+            'removed': [market_id for market_id in published if market_id not in record_hashes],
+            'order': ids,
+        }
+        objects[DELTA_KEY] = (with_markets(header, changed, 'changed'), version)
+        delta = {'key': DELTA_KEY, 'baseVersion': header['baseVersion'], 'changedCount': len(changed)}
+
+    # Spellings of a category that differ only in case or punctuation share a key, so they share a shard,
+    # named after the most common spelling
+    by_key: dict[str, tuple[dict[str, int], list[bytes]]] = {}
+    for m, r in zip(markets, records):
+        category = m.category or 'Uncategorized'
+        names, shard = by_key.setdefault(category_key(category), ({}, []))
+        names[category] = names.get(category, 0) + 1
+        shard.append(r)
+    categories = []
+    for key, (names, shard) in sorted(by_key.items()):
+        category, shard_version = max(sorted(names), key=names.__getitem__), content_hash(b','.join(shard))
+        header = {'category': category, 'version': shard_version, 'marketCount': len(shard)}
+        objects[key] = (with_markets({'schemaVersion': PUBLISHED_SCHEMA_VERSION, **header}, shard), shard_version)
+        categories.append({**header, 'key': key})
+
+    manifest = compact_json({
+        'schemaVersion': PUBLISHED_SCHEMA_VERSION, 'lastUpdated': last_updated, 'version': version,
+        'marketCount': len(markets), 'delta': delta, 'categories': categories,
+    })
+    return objects, manifest, record_hashes
+
+def compress_variants(body: bytes) -> dict[str, bytes]:
+    """Content-Encoding -> precompressed body."""
+    return {
+        'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+        # Quality 11 is ~15% smaller again but ~30x slower, seconds a run on the event loop for the full feed
+        'br': brotli.compress(body, quality=9),
+    }
+
+def load_published_version(key: str) -> str | None:
+    row = get_db().execute('SELECT version FROM publish_state WHERE object_key = ?', (key,)).fetchone()
+    return row[0] if row else None
+
+def save_published_version(key: str, version: str) -> None:
+    conn = get_db()
+    conn.execute(
+        'INSERT OR REPLACE INTO publish_state (object_key, version, published_at) VALUES (?, ?, ?)',
+        (key, version, datetime.now(UTC).isoformat()),
+    )
+    conn.commit()
+
+def get_s3_client() -> Any:
+    """The process-wide R2 client, or None without credentials. Its connection pool is reused across uploads."""
+    global _s3_client
     account_id = os.getenv('CLOUDFLARE_ACCOUNT_ID')
     access_key = os.getenv('R2_ACCESS_KEY_ID')
     secret_key = os.getenv('R2_SECRET_ACCESS_KEY')
-    bucket_name = os.getenv('R2_BUCKET_NAME', 'polynews')
-
     if not all([account_id, access_key, secret_key]):
-        print("⚠️  R2 credentials not found, skipping upload")
-        return False
-
-    try:
-        s3 = boto3.client(
+        return None
+    if _s3_client is None:
+        _s3_client = boto3.client(
             's3',
             endpoint_url=f'https://{account_id}.r2.cloudflarestorage.com',
             aws_access_key_id=access_key,
             aws_secret_access_key=secret_key,
-            config=Config(signature_version='s3v4'),
+            config=Config(
+                signature_version='s3v4',
+                retries={'max_attempts': MAX_RETRIES + 1, 'mode': 'standard'},
+                max_pool_connections=R2_CONCURRENCY,
+            ),
         )
+    return _s3_client
 
-        json_data = json.dumps(data, cls=DecimalEncoder)
-        s3.put_object(
+async def put_object_async(s3: Any, semaphore: asyncio.Semaphore, **kwargs: Any) -> None:
+    # boto3 is blocking; worker threads share the client's pool and its retries with backoff
+    async with semaphore:
+        await asyncio.to_thread(s3.put_object, **kwargs)
+
+async def upload_to_r2_async(objects: dict[str, tuple[bytes, str]], manifest: bytes) -> bool:
+    """Upload precompressed objects whose version is not already in Cloudflare R2, then the manifest."""
+    s3 = get_s3_client()
+    if s3 is None:
+        print("⚠️  R2 credentials not found, skipping upload")
+        return False
+    bucket_name = os.getenv('R2_BUCKET_NAME', 'polynews')
+    semaphore = asyncio.Semaphore(R2_CONCURRENCY)
+
+    async def upload(key: str, body: bytes, version: str) -> None:
+        # Each key is served gzip-encoded; `<key>.br` is for edges that negotiate brotli
+        await asyncio.gather(*(
+            put_object_async(
+                s3, semaphore,
+                Bucket=bucket_name,
+                Key=key if encoding == 'gzip' else f'{key}.{encoding}',
+                Body=compressed,
+                ContentType='application/json',
+                ContentEncoding=encoding,
+                Metadata={'content-hash': version},
+            )
+            for encoding, compressed in compress_variants(body).items()
+        ))
+
+    changed = {key: obj for key, obj in objects.items() if load_published_version(key) != obj[1]}
+    results = await asyncio.gather(*(upload(key, *obj) for key, obj in changed.items()), return_exceptions=True)
+    failed = {key: e for key, e in zip(changed, results) if isinstance(e, Exception)}
+    for key, (_, version) in changed.items():
+        if key not in failed:
+            save_published_version(key, version)
+    if failed:
+        # Leave the old manifest in place so clients never see versions that are missing from R2
+        print(f"❌ R2 upload failed for {len(failed)}/{len(changed)} objects: {failed}")
+        return False
+
+    try:
+        await put_object_async(
+            s3, semaphore,
             Bucket=bucket_name,
-            Key='markets.json',
-            Body=json_data,
+            Key=SIDECAR_KEY,
+            Body=manifest,
             ContentType='application/json',
+            CacheControl='no-cache',
         )
-        print(f"✅ Uploaded to R2: {bucket_name}/markets.json")
-        return True
     except Exception as e:
         print(f"❌ R2 upload failed: {e}")
         return False
+    print(f"✅ Uploaded to R2: {bucket_name}, {len(changed)}/{len(objects)} objects changed, {SIDECAR_KEY} refreshed")
+    return True
+
+def upload_to_r2(objects: dict[str, tuple[bytes, str]], manifest: bytes) -> bool:
+    return run_async(upload_to_r2_async(objects, manifest))
 
-def save_markets(markets: list[dict[str, Any]]) -> None:
-    data = {'lastUpdated': datetime.now(UTC).isoformat().replace('+00:00', 'Z'), 'marketCount': len(markets), 'markets': markets}
+def save_markets(markets: list[Market]) -> None:
+    last_updated = datetime.now(UTC).isoformat().replace('+00:00', 'Z')
+    objects, manifest, record_hashes = build_publication(markets, last_updated)
 
     # Save locally
-    with open(OUTPUT_FILE, 'w') as f:
-        json.dump(data, f, indent=2, cls=DecimalEncoder)
+    os.makedirs(local_path(CATEGORY_PREFIX), exist_ok=True)
+    for key, (body, _) in objects.items():
+        with open(local_path(key), 'wb') as f:
+            f.write(body)
+    for name in os.listdir(local_path(CATEGORY_PREFIX)):
+        if CATEGORY_PREFIX + name not in objects:
+            os.remove(local_path(CATEGORY_PREFIX + name))
+    with open(local_path(SIDECAR_KEY), 'wb') as f:
+        f.write(manifest)
+    if DELTA_KEY in objects:
+        save_published_records(record_hashes)
 
     # Upload to R2
-    upload_to_r2(data)
+    upload_to_r2(objects, manifest)
 
-def save_historical_snapshot(markets: list[dict[str, Any]]) -> None:
-    timestamp = datetime.now(UTC).strftime('%Y-%m-%d_%H-%M')
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('INSERT OR REPLACE INTO snapshots (timestamp, markets_json) VALUES (?, ?)',
-                   (timestamp, json.dumps(markets, cls=DecimalEncoder)))
-    conn.commit()
-    conn.close()
-    cleanup_old_snapshots()
+def market_meta_row(market: Market, ts: str) -> tuple[Any, ...]:
+    meta = (
+        market.question, market.slug, market.description, market.end_date,
+        market.neg_risk_id, json.dumps(market.outcomes, separators=(',', ':')),
+        market.event_title, market.event_slug,
+    )
+    meta_hash = hashlib.blake2b(json.dumps(meta).encode(), digest_size=8).hexdigest()
+    return (market.id, meta_hash, *meta, ts)
+
+def price_tick(market: Market) -> tuple[str, float, float | None] | None:
+    if market.prices is None:
+        return None
+    return json.dumps(market.prices, separators=(',', ':')), market.volume, market.liquidity
+
+def write_snapshot(
+    conn: sqlite3.Connection,
+    markets: list[Market],
+    ts: str,
+    unchanged: set[str] | frozenset[str] = frozenset(),
+) -> tuple[int, int]:
+    """Write a whole snapshot in one go. Returns (meta rows, tick rows)."""
+    written = write_snapshot_rows(conn, markets, ts, unchanged)
+    conn.execute('INSERT OR REPLACE INTO snapshot_runs (ts, market_count) VALUES (?, ?)', (ts, len(markets)))
+    return written
+
+def write_snapshot_rows(
+    conn: sqlite3.Connection,
+    markets: list[Market],
+    ts: str,
+    unchanged: set[str] | frozenset[str] = frozenset(),
+) -> tuple[int, int]:
+    """Write metadata and price ticks that changed since the last snapshot. Returns (meta rows, tick rows).
+
+    Markets in `unchanged` are known identical to the previous fetch and are skipped outright. The rows
+    are compared with, and recorded in, `_snapshot_state` before the caller commits them; a caller whose
+    commit fails must reset it.
+    """
+    global _snapshot_state
+    if _snapshot_state is None:
+        _snapshot_state = (
+            dict(conn.execute('SELECT market_id, meta_hash FROM market_meta')),
+            {mid: (prices, volume, liquidity) for mid, prices, volume, liquidity in
+             conn.execute('SELECT market_id, prices, volume, liquidity FROM latest_ticks')},
+        )
+    meta_hashes, latest = _snapshot_state
 
-def cleanup_old_snapshots() -> None:
+    meta_rows, tick_rows = [], []
+    for market in markets:
+        mid = market.id
+        if mid in unchanged:
+            continue
+        meta_row = market_meta_row(market, ts)
+        if meta_hashes.get(mid) != meta_row[1]:
+            meta_rows.append(meta_row)
+            meta_hashes[mid] = meta_row[1]
+        tick = price_tick(market)
+        if tick and latest.get(mid) != tick:
+            tick_rows.append((mid, ts, *tick))
+            latest[mid] = tick
+
+    conn.executemany('''
+        INSERT OR REPLACE INTO market_meta (market_id, meta_hash, question, slug, description, end_date,
+            neg_risk_market_id, outcomes, event_title, event_slug, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', meta_rows)
+    conn.executemany('INSERT OR REPLACE INTO price_ticks (market_id, ts, prices, volume, liquidity) VALUES (?, ?, ?, ?, ?)', tick_rows)
+    conn.executemany('INSERT OR REPLACE INTO latest_ticks (market_id, ts, prices, volume, liquidity) VALUES (?, ?, ?, ?, ?)', tick_rows)
+    return len(meta_rows), len(tick_rows)
+
+class SnapshotWriter:
+    """Writes one run's snapshot from pages as they stream in, on a thread with its own connection.
+
+    The queue is bounded, so a slow disk holds the fetch back instead of letting pages pile up.
+    Pages are committed one by one; the `snapshot_runs` row that makes the run visible comes last.
+    """
+
+    def __init__(self, ts: str) -> None:
+        self.ts = ts
+        self.queue: queue.Queue[tuple[list[Market], frozenset[str]] | None] = queue.Queue(SNAPSHOT_QUEUE_PAGES)
+        self.markets = self.meta_written = self.ticks_written = 0
+        self.error: Exception | None = None
+        self.thread = threading.Thread(target=self._run, name='snapshot', daemon=True)
+        self.thread.start()
+
+    def add(self, page: list[Market], unchanged: frozenset[str]) -> None:
+        self.queue.put((page, unchanged))
+
+    def close(self) -> None:
+        """Record the run, prune old history and wait for the writer; re-raises its error."""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        configure_wal(conn)
+        item = None
+        try:
+            while (item := self.queue.get()) is not None:
+                page, unchanged = item
+                with _metrics.stage('snapshot'):
+                    meta_written, ticks_written = write_snapshot_rows(conn, page, self.ts, unchanged)
+                    conn.commit()
+                self.markets += len(page)
+                self.meta_written += meta_written
+                self.ticks_written += ticks_written
+            with _metrics.stage('snapshot'):
+                conn.execute('INSERT OR REPLACE INTO snapshot_runs (ts, market_count) VALUES (?, ?)', (self.ts, self.markets))
+                conn.commit()
+                log.info(f"Snapshot {self.ts}: {self.ticks_written}/{self.markets} price ticks, {self.meta_written} metadata rows changed")
+                cleanup_old_snapshots(conn)
+        except Exception as e:
+            global _snapshot_state
+            self.error = e
+            # The rolled-back rows are already in the change-detection state; reload it next run
+            _snapshot_state = None
+            # Keep draining so the fetch never blocks on a dead writer
+            while item is not None:
+                item = self.queue.get()
+        finally:
+            _metrics.sqlite_rows_written += conn.total_changes
+            conn.close()
+
+# Folds rows of `source` (market_id, ts, bucket, open, high, low, close, prices, volume, liquidity) into buckets
+ROLLUP_SQL = '''
+    INSERT OR REPLACE INTO price_rollups (market_id, resolution, bucket, open, high, low, close, prices, volume, liquidity)
+    SELECT market_id, :resolution, bucket,
+        MAX(CASE WHEN ts = first_ts THEN open END), MAX(high), MIN(low), MAX(CASE WHEN ts = last_ts THEN close END),
+        MAX(CASE WHEN ts = last_ts THEN prices END), MAX(CASE WHEN ts = last_ts THEN volume END),
+        MAX(CASE WHEN ts = last_ts THEN liquidity END)
+    FROM (
+        SELECT *, MIN(ts) OVER w AS first_ts, MAX(ts) OVER w AS last_ts FROM ({source})
+        WINDOW w AS (PARTITION BY market_id, bucket)
+    ) GROUP BY market_id, bucket
+'''
+TICK_SOURCE = '''
+    SELECT market_id, ts, substr(ts, 1, 13) || '-00' AS bucket,
+        price AS open, price AS high, price AS low, price AS close, prices, volume, liquidity
+    FROM (SELECT *, json_extract(prices, '$[0]') AS price FROM price_ticks WHERE ts < :cutoff)
+'''
+HOURLY_SOURCE = '''
+    SELECT market_id, bucket AS ts, substr(bucket, 1, 10) || '_00-00' AS bucket,
+        open, high, low, close, prices, volume, liquidity
+    FROM price_rollups WHERE resolution = 'hour' AND bucket < :cutoff
+'''
+
+def roll_up_history(conn: sqlite3.Connection, now: datetime) -> None:
+    """Fold raw ticks into hourly rollups and hourly into daily ones as they age out of their tier.
+
+    Cutoffs fall on bucket boundaries, so a bucket is only ever rolled up once it is complete.
+    """
+    hour_cutoff = (now - RAW_RETENTION).replace(minute=0, second=0, microsecond=0).strftime(SNAPSHOT_TS_FORMAT)
+    day_cutoff = (now - HOURLY_RETENTION).replace(hour=0, minute=0, second=0, microsecond=0).strftime(SNAPSHOT_TS_FORMAT)
+    conn.execute(ROLLUP_SQL.format(source=TICK_SOURCE), {'resolution': 'hour', 'cutoff': hour_cutoff})
+    conn.execute('DELETE FROM price_ticks WHERE ts < ?', (hour_cutoff,))
+    conn.execute(ROLLUP_SQL.format(source=HOURLY_SOURCE), {'resolution': 'day', 'cutoff': day_cutoff})
+    conn.execute("DELETE FROM price_rollups WHERE resolution = 'hour' AND bucket < ?", (day_cutoff,))
+    # Keep each market's last daily bucket before the horizon: it is still its price at the start of the year
+    conn.execute('''
+        DELETE FROM price_rollups WHERE resolution = 'day' AND bucket < :cutoff
+        AND bucket < (SELECT MAX(bucket) FROM price_rollups p
+                      WHERE p.market_id = price_rollups.market_id AND p.resolution = 'day' AND p.bucket < :cutoff)
+    ''', {'cutoff': (now - DAILY_RETENTION).strftime(SNAPSHOT_TS_FORMAT)})
+
+def cleanup_old_snapshots(conn: sqlite3.Connection | None = None) -> None:
     if not os.path.exists(DB_FILE):
         return
-    cutoff = (datetime.now(UTC) - timedelta(days=30)).strftime('%Y-%m-%d_%H-%M')
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute('DELETE FROM snapshots WHERE timestamp < ?', (cutoff,))
+    now = datetime.now(UTC)
+    conn = conn or get_db()
+    conn.execute('DELETE FROM snapshot_runs WHERE ts < ?', ((now - DAILY_RETENTION).strftime(SNAPSHOT_TS_FORMAT),))
+    roll_up_history(conn, now)
+    # Markets that ended before the window are gone for good
+    expired = "SELECT market_id FROM market_meta WHERE end_date < ?"
+    cutoff_date = (now - ENDED_MARKET_RETENTION).strftime('%Y-%m-%d')
+    conn.execute(f'DELETE FROM price_ticks WHERE market_id IN ({expired})', (cutoff_date,))
+    conn.execute(f'DELETE FROM price_rollups WHERE market_id IN ({expired})', (cutoff_date,))
+    if conn.execute(f'DELETE FROM latest_ticks WHERE market_id IN ({expired})', (cutoff_date,)).rowcount:
+        global _snapshot_state
+        _snapshot_state = None
+    conn.execute('DELETE FROM market_meta WHERE end_date < ?', (cutoff_date,))
+    conn.execute('DELETE FROM market_features WHERE updated_at < ?', ((now - FEATURE_RETENTION).timestamp(),))
+    compact_redundancy_cache(conn)
+    compact_llm_cache(conn)
+    conn.commit()
+    # Hand a bounded number of freed pages back each run instead of a full VACUUM
+    conn.execute(f'PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES})').fetchall()
+
+def run_pipeline() -> None:
+    global _metrics
+    _metrics = RunMetrics(ts=datetime.now(UTC).strftime(SNAPSHOT_TS_FORMAT))
+    conn = get_db()
+    changes = conn.total_changes
+    now = datetime.now(UTC)
+    try:
+        with _metrics.stage('total'):
+            # Pages are written to the snapshot as they arrive, and the writer finishes (run row, pruning) while
+            # dedup, LLM calls and publishing run. It only reads fields they never rewrite; closing it last
+            # means the next cycle never overlaps it
+            snapshot = SnapshotWriter(now.strftime(SNAPSHOT_TS_FORMAT))
+            try:
+                with _metrics.stage('fetch'):
+                    stream = fetch_markets(now, snapshot)
+                print(f"Fetched {stream.fetched} markets, {len(stream.survivors)} pass the basic filters")
+                _metrics.markets_fetched = stream.fetched
+                filtered_markets = filter_and_sort_markets(stream)
+                with _metrics.stage('publish'):
+                    save_markets(filtered_markets)
+                print(f"Saved {len(filtered_markets)} markets")
+                _metrics.markets_published = len(filtered_markets)
+            finally:
+                snapshot.close()
+    except Exception as e:
+        _metrics.error = f"{type(e).__name__}: {e}"
+        # Records cached this run may never have reached a committed snapshot; skipping them next run as
+        # unchanged would leave their history stale until they change again
+        _record_cache.records.clear()
+        raise
+    finally:
+        _metrics.sqlite_rows_written += conn.total_changes - changes
+        _metrics.sqlite_bytes_written = checkpoint_db()
+        _metrics.peak_rss_bytes = peak_rss()
+        write_metrics(_metrics)
+
+def peak_rss() -> int:
+    if resource is None:
+        return 0
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+def prometheus_metrics(metrics: RunMetrics) -> str:
+    """Render a run in the Prometheus text exposition format, for node_exporter's textfile collector."""
+    samples: list[tuple[str, str, dict[str, str], float | None]] = [
+        ('polynews_last_run_timestamp_seconds', "Start of the last run", {}, datetime.strptime(metrics.ts, SNAPSHOT_TS_FORMAT).replace(tzinfo=UTC).timestamp()),
+        ('polynews_last_run_success', "1 if the last run completed", {}, float(metrics.error is None)),
+        ('polynews_markets_fetched', "Markets fetched from the API", {}, metrics.markets_fetched),
+        ('polynews_markets_published', "Markets published", {}, metrics.markets_published),
+        ('polynews_http_pages', "API pages fetched", {}, metrics.http_pages),
+        ('polynews_http_retries', "API page retries", {}, metrics.http_retries),
+        ('polynews_http_lost_pages', "API pages lost after retries", {}, metrics.http_lost_pages),
+        ('polynews_sqlite_rows_written', "SQLite rows inserted, updated or deleted", {}, metrics.sqlite_rows_written),
+        ('polynews_sqlite_bytes_written', "Bytes written to the SQLite WAL", {}, metrics.sqlite_bytes_written),
+        ('polynews_peak_rss_bytes', "Peak resident set size of the process", {}, metrics.peak_rss_bytes),
+    ]
+    samples += [('polynews_stage_seconds', "Wall time per pipeline stage", {'stage': k}, v) for k, v in metrics.stages.items()]
+    samples += [('polynews_http_page_latency_seconds', "API page latency", {'quantile': k}, v) for k, v in metrics.http_latency.items()]
+    for kind, stats in metrics.llm.items():
+        samples += [
+            ('polynews_llm_calls', "LLM calls", {'kind': kind}, stats.calls),
+            ('polynews_llm_errors', "Failed LLM calls", {'kind': kind}, stats.errors),
+            ('polynews_llm_seconds', "Time spent waiting on LLM calls", {'kind': kind}, stats.seconds),
+            ('polynews_llm_prompt_tokens', "LLM prompt tokens", {'kind': kind}, stats.prompt_tokens),
+            ('polynews_llm_response_tokens', "LLM response tokens", {'kind': kind}, stats.response_tokens),
+        ]
+    for cache, stats in metrics.caches.items():
+        samples += [
+            ('polynews_cache_hits', "Cache hits", {'cache': cache}, stats.hits),
+            ('polynews_cache_misses', "Cache misses", {'cache': cache}, stats.misses),
+        ]
+
+    lines, described = [], set()
+    for name, help_text, labels, value in samples:
+        if name not in described:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            described.add(name)
+        label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+        lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+def write_metrics(metrics: RunMetrics) -> None:
+    """Append the run to METRICS_FILE as a JSON line, replace METRICS_TEXTFILE and store it in `run_metrics`."""
+    record = metrics.model_dump_json()
+    with open(METRICS_FILE, 'a') as f:
+        f.write(record + '\n')
+    # Written beside and renamed so the textfile collector never reads a partial file
+    with open(METRICS_TEXTFILE + '.tmp', 'w') as f:
+        f.write(prometheus_metrics(metrics))
+    os.replace(METRICS_TEXTFILE + '.tmp', METRICS_TEXTFILE)
+    conn = get_db()
+    conn.execute(
+        'INSERT OR REPLACE INTO run_metrics (ts, total_seconds, error, metrics) VALUES (?, ?, ?, ?)',
+        (metrics.ts, metrics.stages.get('total'), metrics.error, record),
+    )
     conn.commit()
-    conn.close()
+
+def run_daemon(interval: timedelta) -> None:
+    """Run the pipeline every `interval` (± jitter) with warm clients, DB connection and caches until SIGINT/SIGTERM."""
+    global _loop, _http_client, _genai_client
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    # One persistent event loop so async HTTP/LLM clients and their connection pools survive between cycles
+    _loop = asyncio.new_event_loop()
+    _record_cache.enabled = True
+    loop_thread = threading.Thread(target=_loop.run_forever, daemon=True)
+    loop_thread.start()
+    _http_client = make_http_client()
+    init_database()
+    print(f"🕒 Daemon started: every {interval} ± {DAEMON_JITTER.total_seconds():.0f}s")
+
+    try:
+        while not stop.is_set():
+            started = time.monotonic()
+            try:
+                run_pipeline()
+            except Exception as e:
+                log.exception(f"❌ Cycle failed: {e}")
+            elapsed = time.monotonic() - started
+            jitter = random.uniform(-1, 1) * DAEMON_JITTER.total_seconds()
+            delay = max(0.0, interval.total_seconds() + jitter - elapsed)
+            print(f"Cycle took {elapsed:.1f}s, next in {delay:.0f}s")
+            stop.wait(delay)
+    finally:
+        run_async(_http_client.aclose())
+        _loop.call_soon_threadsafe(_loop.stop)
+        loop_thread.join()
+        _loop, _http_client, _genai_client = None, None, None
+        close_db()
+        print("👋 Daemon stopped")
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Fetch Polymarket predictions and publish markets.json")
+    parser.add_argument('--daemon', action='store_true', help="keep running and refresh every --interval minutes")
+    parser.add_argument('--interval', type=float, default=15, help="daemon refresh interval in minutes (default: 15)")
+    args = parser.parse_args()
+
+    if args.daemon:
+        run_daemon(timedelta(minutes=args.interval))
+        return
     init_database()
-    all_markets = fetch_all_markets()
-    print(f"Fetched {len(all_markets)} markets")
-    save_historical_snapshot(all_markets)
-    historical_snapshots = load_historical_snapshots()
-    filtered_markets = filter_and_sort_markets(all_markets, historical_snapshots)
-    save_markets(filtered_markets)
-    print(f"Saved {len(filtered_markets)} markets")
+    run_pipeline()
+    close_db()
 
 if __name__ == '__main__':
     main()
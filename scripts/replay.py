@@ -0,0 +1,257 @@
+"""Replay stored history through the deterministic pipeline stages to see what the feed would have been.
+
+Every run in `snapshot_runs` is rebuilt from `market_meta` and the price history (raw ticks, then the
+hourly and daily rollups), then run through the basic filters, related-market dedup, cached redundancy
+decisions plus local ladder resolution, price changes and ranking. The LLM never runs: redundancy
+decisions and statements come from `redundancy_cache` and `statement_cache`, uncached statements fall
+back to the question text. Runs are sharded by time across a process pool; each shard streams its
+history rows in order and writes the published order of every run to `replay_markets` in --output.
+
+Replayed runs are approximations: metadata is the latest stored version, markets that left the API
+before their end date still look listed, past RAW_RETENTION prices are as coarse as their rollup, and
+the running `features` are not replayed.
+
+    uv run python scripts/replay.py --days 30 --label baseline
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import closing
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import fetch_markets as fm
+
+# Shards per worker, so a slow stretch of history does not leave the other workers idle
+SHARDS_PER_WORKER = 4
+OUTPUT_FILE = "replay.db"
+
+# prices, volume, liquidity
+Tick = tuple[tuple[float, ...], float | None, float | None]
+
+# Per-worker state, loaded once by init_worker
+_conn: sqlite3.Connection | None = None
+_meta: dict[str, tuple[Any, ...]] = {}
+_statements: dict[tuple[str, str, str], tuple[str, str]] = {}
+_redundancy: dict[str, tuple[str | None, str | None]] = {}
+_ranking: tuple[dict[str, float], int | None, int | None] = (fm.RANKING_WEIGHTS, None, None)
+
+def init_worker(db_file: str, ranking: tuple[dict[str, float], int | None, int | None]) -> None:
+    """Open the history database and load metadata and LLM caches once per worker."""
+    global _conn, _meta, _statements, _redundancy, _ranking
+    # The pipeline's progress output would repeat for every replayed run
+    sys.stdout = open(os.devnull, 'w')
+    _conn = sqlite3.connect(db_file, timeout=fm.DB_BUSY_TIMEOUT)
+    _meta = {
+        mid: (question, slug, end_date, neg_risk_id, tuple(json.loads(outcomes)) if outcomes else (), event_title, event_slug)
+        for mid, question, slug, end_date, neg_risk_id, outcomes, event_title, event_slug in _conn.execute('''
+            SELECT market_id, question, slug, end_date, neg_risk_market_id, outcomes, event_title, event_slug FROM market_meta
+        ''')
+    }
+    _statements = {row[:3]: row[3:] for row in _conn.execute(
+        'SELECT market_id, outcome, content_hash, statement, category FROM statement_cache')}
+    _redundancy = {mid: (redundant_of, q_hash) for mid, redundant_of, q_hash in _conn.execute(
+        'SELECT market_id, redundant_of, question_hash FROM redundancy_cache')}
+    _ranking = ranking
+
+def parse_tick(prices: str, volume: float | None, liquidity: float | None) -> Tick:
+    return tuple(json.loads(prices)), volume, liquidity
+
+# A rollup is keyed by its bucket's start but holds its close, so it only counts from the bucket's end:
+# the start of the bucket that `ts` falls in, and the end time it is streamed at
+BUCKET_OF = {
+    'hour': "substr({ts}, 1, 13) || '-00'",
+    'day': "substr({ts}, 1, 10) || '_00-00'",
+}
+BUCKET_END = {
+    'hour': "strftime('%Y-%m-%d_%H-%M', substr(bucket, 1, 10) || ' ' || substr(bucket, 12, 2) || ':00', '+1 hour')",
+    'day': "strftime('%Y-%m-%d_%H-%M', substr(bucket, 1, 10), '+1 day')",
+}
+
+def initial_state(ts: str) -> dict[str, Tick]:
+    """Each market's latest history row at or before `ts`; newer tiers overwrite older ones."""
+    state: dict[str, Tick] = {}
+    for resolution in ('day', 'hour'):
+        for mid, prices, volume, liquidity, _ in _conn.execute(f'''
+            SELECT market_id, prices, volume, liquidity, MAX(bucket) FROM price_rollups
+            WHERE resolution = ? AND bucket < {BUCKET_OF[resolution].format(ts='?')} GROUP BY market_id
+        ''', (resolution, ts)):
+            state[mid] = parse_tick(prices, volume, liquidity)
+    for mid, prices, volume, liquidity, _ in _conn.execute('''
+        SELECT market_id, prices, volume, liquidity, MAX(ts) FROM price_ticks WHERE ts <= ? GROUP BY market_id
+    ''', (ts,)):
+        state[mid] = parse_tick(prices, volume, liquidity)
+    return state
+
+def build_markets(state: dict[str, Tick]) -> list[fm.Market]:
+    markets = []
+    for mid, (prices, volume, liquidity) in state.items():
+        meta = _meta.get(mid)
+        if meta is None:
+            continue
+        question, slug, end_date, neg_risk_id, outcomes, event_title, event_slug = meta
+        markets.append(fm.Market(
+            id=mid, question=question or '', end_date=end_date, active=True, closed=False,
+            volume=volume or 0.0, liquidity=liquidity, outcomes=outcomes, prices=prices,
+            slug=slug, neg_risk_id=neg_risk_id, event_title=event_title, event_slug=event_slug,
+        ))
+    return markets
+
+def drop_redundant(markets: list[fm.Market]) -> list[fm.Market]:
+    """The semantic dedup without the LLM: cached decisions that still hold, then ladders resolved locally."""
+    ids = {m.id for m in markets}
+    kept = []
+    for m in markets:
+        redundant_of, q_hash = _redundancy.get(m.id, (None, None))
+        if redundant_of is not None and q_hash == fm.question_hash(m) and (
+                redundant_of == fm.REDUNDANT_UNKNOWN or redundant_of in ids):
+            continue
+        kept.append(m)
+    ladders = fm.resolve_ladders(kept)
+    return [m for m in kept if m.id not in ladders]
+
+def replay_run(ts: str, state: dict[str, Tick]) -> tuple[tuple[Any, ...], list[tuple[Any, ...]]]:
+    """One recorded run through the deterministic stages. Returns its summary row and its published rows."""
+    now = datetime.strptime(ts, fm.SNAPSHOT_TS_FORMAT).replace(tzinfo=UTC)
+    markets = build_markets(state)
+    frame = fm.MarketFrame(markets)
+    kept_rows, skip_reasons = frame.basic_filter(now)
+    survivors = [frame.annotate(i) for i in kept_rows]
+    filtered = drop_redundant(fm.deduplicate_related_markets(survivors))
+
+    ids = [m.id for m in filtered]
+    past = fm.historical_prices(ids, fm.history_timestamps(now, sparkline=False), _conn)
+    price_changes = fm.calculate_price_changes(fm.MarketFrame(filtered), ids, past)
+    for m in filtered:
+        m.price_changes = price_changes[m.id]
+        cached = _statements.get(fm.statement_cache_key(m))
+        if cached:
+            m.statement, m.category = cached
+        else:
+            fallback = fm.fallback_statement(m)
+            m.statement, m.category = fallback.statement, fallback.category
+
+    ranked = fm.rank_markets(filtered, *_ranking)
+    summary = (ts, len(markets), len(survivors), len(filtered), json.dumps(skip_reasons))
+    rows = [(ts, rank, m.id, m.probability, json.dumps(m.price_changes), m.category) for rank, m in enumerate(ranked, 1)]
+    return summary, rows
+
+def replay_shard(timestamps: list[str]) -> tuple[list[tuple[Any, ...]], list[tuple[Any, ...]]]:
+    """Replay a contiguous, ordered run of timestamps, streaming history rows forward from the first."""
+    state = initial_state(timestamps[0])
+    # Rollups closing in the window, in order of their end; a tick at the same time is newer than the bucket
+    rollups = ' UNION ALL '.join(f'''
+        SELECT {BUCKET_END[resolution]}, {tier}, market_id, prices, volume, liquidity FROM price_rollups
+        WHERE resolution = '{resolution}'
+        AND bucket >= {BUCKET_OF[resolution].format(ts=':start')} AND bucket < {BUCKET_OF[resolution].format(ts=':end')}
+    ''' for tier, resolution in enumerate(('day', 'hour')))
+    history = _conn.execute(f'''
+        SELECT ts, 2, market_id, prices, volume, liquidity FROM price_ticks WHERE ts > :start AND ts <= :end
+        UNION ALL {rollups}
+        ORDER BY 1, 2
+    ''', {'start': timestamps[0], 'end': timestamps[-1]})
+    pending = next(history, None)
+    summaries, rows = [], []
+    for ts in timestamps:
+        while pending is not None and pending[0] <= ts:
+            state[pending[2]] = parse_tick(*pending[3:])
+            pending = next(history, None)
+        summary, run_rows = replay_run(ts, state)
+        summaries.append(summary)
+        rows.extend(run_rows)
+    return summaries, rows
+
+def parse_weights(text: str) -> dict[str, float]:
+    """`volume=1,momentum=0.5` → {'volume': 1.0, 'momentum': 0.5}, checked against fm.RANKING_KEYS."""
+    weights = {name.strip(): float(w) for name, w in (item.split('=') for item in text.split(','))}
+    unknown = set(weights) - set(fm.RANKING_KEYS)
+    if unknown:
+        raise ValueError(f"unknown ranking keys {sorted(unknown)}")
+    return weights
+
+def shard(timestamps: list[str], workers: int) -> list[list[str]]:
+    size = max(1, math.ceil(len(timestamps) / (workers * SHARDS_PER_WORKER)))
+    return [timestamps[i:i + size] for i in range(0, len(timestamps), size)]
+
+def init_output(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS replay_runs (
+            label TEXT NOT NULL,
+            ts TEXT NOT NULL,
+            market_count INTEGER NOT NULL,
+            basic_count INTEGER NOT NULL,
+            published_count INTEGER NOT NULL,
+            skip_reasons TEXT NOT NULL,
+            PRIMARY KEY (label, ts)
+        ) WITHOUT ROWID
+    ''')
+    # Published order of each replayed run; compare labels to see what a change does to the feed
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS replay_markets (
+            label TEXT NOT NULL,
+            ts TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            market_id TEXT NOT NULL,
+            probability REAL,
+            price_changes TEXT,
+            category TEXT,
+            PRIMARY KEY (label, ts, rank)
+        ) WITHOUT ROWID
+    ''')
+    conn.commit()
+    return conn
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=float, default=30, help="replay runs from the last DAYS days (default: 30)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    parser.add_argument('--label', default='replay', help="name of this replay in the output tables; reusing it replaces it")
+    parser.add_argument('--db', default=fm.DB_FILE, help=f"history database (default: {fm.DB_FILE})")
+    parser.add_argument('--output', default=OUTPUT_FILE, help=f"database the replay tables are written to (default: {OUTPUT_FILE})")
+    parser.add_argument('--top', type=int, default=fm.MAX_PUBLISHED, help="keep only the first TOP published markets of each run")
+    parser.add_argument('--per-category', type=int, default=fm.MAX_PER_CATEGORY, help="publish at most N markets per category")
+    parser.add_argument('--weights', type=parse_weights, default=fm.RANKING_WEIGHTS,
+                        help=f"ranking key weights, e.g. volume=1,momentum=0.5 (keys: {', '.join(fm.RANKING_KEYS)})")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        sys.exit(f"{args.db} not found")
+    since = (datetime.now(UTC) - timedelta(days=args.days)).strftime(fm.SNAPSHOT_TS_FORMAT)
+    with closing(sqlite3.connect(args.db, timeout=fm.DB_BUSY_TIMEOUT)) as conn:
+        timestamps = [row[0] for row in conn.execute('SELECT ts FROM snapshot_runs WHERE ts >= ? ORDER BY ts', (since,))]
+    if not timestamps:
+        print(f"No runs recorded in the last {args.days:g} days")
+        return
+
+    shards = shard(timestamps, args.workers)
+    print(f"Replaying {len(timestamps)} runs ({timestamps[0]} → {timestamps[-1]}) in {len(shards)} shards on {args.workers} workers...")
+    started = time.perf_counter()
+    published = 0
+    with closing(init_output(args.output)) as out:
+        out.execute('DELETE FROM replay_runs WHERE label = ?', (args.label,))
+        out.execute('DELETE FROM replay_markets WHERE label = ?', (args.label,))
+        # Spawned workers open their own connections rather than inheriting the parent's SQLite state
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(args.workers, mp_context=context, initializer=init_worker, initargs=(args.db, (args.weights, args.top, args.per_category))) as pool:
+            futures = [pool.submit(replay_shard, s) for s in shards]
+            for done, future in enumerate(as_completed(futures), 1):
+                summaries, rows = future.result()
+                out.executemany('INSERT INTO replay_runs VALUES (?, ?, ?, ?, ?, ?)', ((args.label, *s) for s in summaries))
+                out.executemany('INSERT INTO replay_markets VALUES (?, ?, ?, ?, ?, ?, ?)', ((args.label, *r) for r in rows))
+                out.commit()
+                published += len(rows)
+                print(f"  ✓ Shard {done}/{len(shards)}: {summaries[0][0]} → {summaries[-1][0]}")
+    elapsed = time.perf_counter() - started
+    print(f"Replayed {len(timestamps)} runs in {elapsed:.1f}s ({len(timestamps) / elapsed:.1f} runs/s), "
+          f"{published} published rows written to {args.output} as '{args.label}'")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import json
+from datetime import UTC, datetime, timedelta
+
+import numpy as np
+import pytest
+
+import fetch_markets as fm
+
+STEP = timedelta(minutes=15)
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    """A year and a bit of 15-minute ticks for one market, aged into the rollup tiers by cleanup."""
+    monkeypatch.setattr(fm, 'DB_FILE', str(tmp_path / 'markets.db'))
+    fm.close_db()
+    fm.init_database()
+    conn = fm.get_db()
+    now = datetime.fromtimestamp(datetime.now(UTC).timestamp() // STEP.total_seconds() * STEP.total_seconds(), UTC)
+    series = []
+    t = now - fm.DAILY_RETENTION - timedelta(days=10)
+    while t <= now:
+        # Every tick has its own price, so a lookup shows exactly which tick it returned
+        series.append((t, len(series) / 100_000))
+        t += STEP
+    ts = [t.strftime(fm.SNAPSHOT_TS_FORMAT) for t, _ in series]
+    conn.executemany('INSERT INTO snapshot_runs (ts, market_count) VALUES (?, 1)', ((s,) for s in ts))
+    conn.executemany('INSERT INTO price_ticks VALUES (?, ?, ?, ?, ?)', (
+        ('m1', s, json.dumps([p, 1 - p]), 1.0, 1.0) for s, (_, p) in zip(ts, series)))
+    conn.commit()
+    fm.cleanup_old_snapshots(conn)
+    yield now, series, conn
+    fm.close_db()
+
+@pytest.mark.parametrize('age, precision', [
+    (timedelta(hours=5, minutes=10), timedelta(0)),
+    (timedelta(hours=47, minutes=50), timedelta(0)),
+    (timedelta(days=3, minutes=50), timedelta(hours=1)),
+    (timedelta(days=6, hours=7, minutes=20), timedelta(hours=1)),
+    (timedelta(days=8, hours=11), timedelta(days=1)),
+    (timedelta(days=200, hours=23, minutes=55), timedelta(days=1)),
+])
+def test_as_of_matches_raw_series(history, age, precision):
+    now, series, conn = history
+    assert conn.execute("SELECT COUNT(*) FROM price_rollups WHERE resolution = 'day'").fetchone()[0]
+    target = now - age
+    raw = {p: t for t, p in series}
+    latest = max(t for t, _ in series if t <= target)
+
+    snapshot_ts, prices = fm.as_of(target, ['m1', 'missing'], conn)
+
+    assert snapshot_ts == latest.strftime(fm.SNAPSHOT_TS_FORMAT)
+    assert set(prices) == {'m1'}
+    seen = raw[prices['m1'][0]]
+    # Never a price from after the run looked up, and never older than one bucket
+    assert seen <= latest
+    assert latest - seen <= precision
+
+def test_horizons_take_a_jittered_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(fm, 'DB_FILE', str(tmp_path / 'markets.db'))
+    fm.close_db()
+    fm.init_database()
+    conn = fm.get_db()
+    now = datetime(2026, 10, 17, 12, 0, 20, tzinfo=UTC)
+    # The previous runs started 14m30s and 29m30s before this one
+    for age, price in ((timedelta(minutes=29, seconds=30), 0.2), (timedelta(minutes=14, seconds=30), 0.4)):
+        ts = (now - age).strftime(fm.SNAPSHOT_TS_FORMAT)
+        conn.execute('INSERT INTO snapshot_runs (ts, market_count) VALUES (?, 1)', (ts,))
+        conn.execute('INSERT INTO price_ticks VALUES (?, ?, ?, 1.0, 1.0)', ('m1', ts, json.dumps([price, 1 - price])))
+    conn.commit()
+
+    past = fm.historical_prices(['m1'], fm.history_timestamps(now, sparkline=False), conn)
+
+    assert past[0, list(fm.PRICE_CHANGE_HORIZONS).index('minutes15')] == 0.4
+    assert np.isnan(past[0, list(fm.PRICE_CHANGE_HORIZONS).index('hour1')])
+    fm.close_db()
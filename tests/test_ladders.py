@@ -0,0 +1,46 @@
+from datetime import UTC, datetime
+
+import fetch_markets as fm
+
+def end_ts(date: str) -> float:
+    return datetime.fromisoformat(date).replace(tzinfo=UTC).timestamp()
+
+def deadline(question: str, end: str | None = None) -> tuple[tuple[str, ...], float] | None:
+    rungs = [r for r in fm.ladder_rungs(question, end_ts(end) if end else float('nan')) if r[0][-1] == 'by']
+    return rungs[0] if rungs else None
+
+def market(mid: str, question: str, end_date: str) -> fm.Market:
+    return fm.Market(id=mid, question=question, end_date=end_date, active=True, closed=False,
+                     volume=1.0, liquidity=None, outcomes=('Yes', 'No'), prices=(0.5, 0.5))
+
+def test_explicit_year_keeps_day_and_year():
+    key, strength = deadline('Will X happen by June 2026?')
+    assert key == ('will x happen by @?', 'by')
+    assert strength == -((2026 * 12 + 6) * 32 + 31)
+    assert deadline('Will X happen by June 30, 2026?')[1] == -((2026 * 12 + 6) * 32 + 30)
+    assert deadline('Will X happen by June 30th?', '2026-06-30')[1] == -((2026 * 12 + 6) * 32 + 30)
+
+def test_missing_year_comes_from_end_date():
+    december = deadline('Will X happen by December 31?', '2026-12-31')
+    january = deadline('Will X happen by January 31?', '2027-01-31')
+    assert december[0] == january[0]
+    assert december[1] > january[1]
+    # A deadline just past the new year still belongs to the year the market ends near
+    assert deadline('Will X happen by December 31?', '2027-01-02')[1] == december[1]
+
+def test_missing_year_without_end_date_is_not_a_rung():
+    assert deadline('Will X happen by December 31?') is None
+    assert fm.ladder_rungs('Will X happen by the end of the year?') == []
+
+def test_thresholds():
+    (key, strength), = fm.ladder_rungs('Will BTC be above $100k on Friday?')
+    assert key == ('will btc be above $# on friday?', '1')
+    assert strength == 100_000
+    assert fm.ladder_rungs('Will BTC dip to 80,000?')[0][1] == -80_000
+
+def test_earlier_deadline_implies_later_across_new_year():
+    december = market('dec', 'Will X happen by December 31?', '2026-12-31')
+    january = market('jan', 'Will X happen by January 31?', '2027-01-31')
+    decisions = fm.resolve_ladders([december, january])
+    assert set(decisions) == {'jan'}
+    assert decisions['jan'][0] == 'dec'